@@ -1,92 +1,73 @@
-from const import AgentState, Percept, Object, Action, World, Direction
-from kb import KnowledgeBase
-import json
+from const import AgentState, Object, Action, World, Direction
+from typing import TYPE_CHECKING
+from events import (EventBus, StepStarted, Perceived, KnowledgeUpdated, CellsRanked, WumpusTargeted,
+                    PathChosen, ActionsTaken, HazardEvent, StepFinished, RunEnded, StepRecorder)
+from steplog import ENCODERS, LOG_EXTENSIONS, NullSink, make_sink
+import heapq
+import time
+
+if TYPE_CHECKING:
+    from kb import KnowledgeBase
+
+# Moving one cell in each direction
+STEPS = {Direction.UP: (-1, 0), Direction.DOWN: (1, 0), Direction.LEFT: (0, -1), Direction.RIGHT: (0, 1)}
 
 class Agent:
-    def __init__(self, world : World, kb: KnowledgeBase, state: AgentState, output: str = None):
+    def __init__(self, world : World, kb: "KnowledgeBase", state: AgentState, output: str = None,
+                 max_steps: int = None, time_limit: float = None, log_format: str = "full", sink=None,
+                 max_risk: float = None, events: EventBus = None):
         self.world = world
         self.state = state
+        self.size = world.size
+        # The agent climbs out where it entered
+        self.start = state.location
         self.kb = kb
         # Initialize knowledge base with the initial state
         self.kb.add_initial_state(state.location[0], state.location[1])
         self.actions = []
         self.visited = set()
-        self.output = output + ".jsonl" if output else "output/agent_log.jsonl"
-
-        # Log file for visualization
-        self.log_lines = [] # No more using
-        self.log_maps = {
-            "step": 0,
-            "location": self.state.location,
-            "hp": self.state.hp,
-            "potions": self.state.potions,
-            "score": self.state.score,
-            "direction": self.state.direction.name,
-            "arrows": self.state.arrows,
-            "visited": list(self.visited),
-            "ranked": [],
-            "best": None,
-            "wumpus": [],
-            "best_wumpus_cell": None,
-            "adjacent_safe_cells": [],
-            "best_adjacent_cell": None,
-            "path": [],
-            "actions": [],
-            "events": [],
-        }
-
-    def reset_log(self):
-        next_step = self.log_maps["step"] + 1
-        self.log_maps = {
-            "step": next_step,
-            "location": self.state.location,
-            "hp": self.state.hp,
-            "potions": self.state.potions,
-            "score": self.state.score,
-            "direction": self.state.direction.name,
-            "arrows": self.state.arrows,
-            "visited": list(self.visited),
-            "ranked": [],
-            "best": None,
-            "wumpus": [],
-            "best_wumpus_cell": None,
-            "adjacent_safe_cells": [],
-            "best_adjacent_cell": None,
-            "path": [],
-            "actions": [],
-            "events": [],
-        }
-        
-    def parse_log(self, cur_state: AgentState):
-        if cur_state is None:
-            cur_state = self.state
-        log_entry = { 
-            "step": self.log_maps["step"],
-            "location": cur_state.location,
-            "hp": cur_state.hp,
-            "potions": cur_state.potions,
-            "score": cur_state.score,
-            "direction": cur_state.direction.name,
-            "arrows": cur_state.arrows,
-            "visited": list(self.visited),
-            "ranked": list(self.log_maps["ranked"]),
-            "best": list(self.log_maps["best"]) if self.log_maps["best"] else None,
-            "wumpus": list(self.log_maps["wumpus"]),
-            "best_wumpus_cell": list(self.log_maps["best_wumpus_cell"]) if self.log_maps["best_wumpus_cell"] else None,
-            "adjacent_safe_cells": list(self.log_maps["adjacent_safe_cells"]),
-            "best_adjacent_cell": list(self.log_maps["best_adjacent_cell"]) if self.log_maps["best_adjacent_cell"] else None,
-            "path": list(self.log_maps["path"]),
-            "actions": [a for a in self.log_maps["actions"]],
-            "events": list(self.log_maps["events"]),
-        }
-    
-        return log_entry    
+        # Unvisited cells next to a visited one; kept up to date by _mark_visited
+        self.frontier = set()
+        # Cells known to be safe to walk through: visited ones and frontier
+        # cells the knowledge base classified as safe
+        self.safe_cells = set()
+        # Last shortest-path sweep: (start state, parent pointers, best state per cell)
+        self._sweep = None
+        # "full" writes every field each step; "delta" only what changed,
+        # with periodic keyframes; "binary" a packed, indexed trace (all read
+        # back with steplog.open_steps); "none" writes nothing
+        if log_format not in ENCODERS and log_format != "none":
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.log_format = log_format
+        self.output = (output or "output/agent_log") + LOG_EXTENSIONS.get(log_format, ".jsonl")
+        # Where step records go; by default a background writer to self.output
+        self.sink = sink
+        # Stop after this many decision steps / seconds (None = run until done)
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        # Probabilistic mode: with no provably safe cell left, step into a
+        # frontier cell whose chance of a deadly hazard is at most max_risk
+        # (kb.hazard_probabilities) instead of giving up. None = logic only.
+        self.max_risk = max_risk
+        # How the run ended: "climbed", "died", "step_limit" or "time_limit"
+        self.outcome = None
+        self.death_cause = None
+        # Wall time of every decision step, in seconds
+        self.step_times = []
+        self._step_started = None
+
+        # Everything the agent does is announced here; console output and
+        # the step log are subscribers (see events.py)
+        self.events = events or EventBus()
+        self.step = 0
 
     def perceive(self, x: int, y: int):
         percepts = self.world.percept_at(x, y)
+        self.events.emit(Perceived, (x, y), percepts)
         # Update knowledge base with current percepts
         self.kb.add_percepts(x, y, percepts)
-            
+        self.events.emit(KnowledgeUpdated, (x, y), percepts)
+
         return percepts
     
     def _get_adjecent_cells(self, x: int, y: int):
@@ -95,28 +76,31 @@ class Agent:
             (x, y + 1), (x, y - 1)
         ]
         for i in range(len(res)):
-            if (res[i][0] < 0 or res[i][0] > 9 or
-                res[i][1] < 0 or res[i][1] > 9):
+            if (res[i][0] < 0 or res[i][0] >= self.size or
+                res[i][1] < 0 or res[i][1] >= self.size):
                 res[i] = None
 
         return [cell for cell in res if cell is not None]
     
-    def _get_all_visible_safe_cells(self):
-        visible_cells = set()
-        for cell in self.visited:
-            x, y = cell
-            # Add adjacent cells
-            for adj in self._get_adjecent_cells(x, y):
-                if adj not in self.visited and adj not in visible_cells:
-                    visible_cells.add(adj)
+    # Visit a cell: it leaves the frontier and its unvisited neighbours join it
+    def _mark_visited(self, cell):
+        if cell in self.visited:
+            return
+        self.visited.add(cell)
+        self.safe_cells.add(cell)
+        self.frontier.discard(cell)
+        for adj in self._get_adjecent_cells(*cell):
+            if adj not in self.visited:
+                self.frontier.add(adj)
 
-        return visible_cells
+    def _get_all_visible_safe_cells(self):
+        return self.frontier
 
     # Get actions to turn to the desired direction
     # Returns a list of actions to turn to the desired direction
-    def _get_turn_actions(self, desired: Direction):
+    def _get_turn_actions(self, desired: Direction, state: AgentState = None):
         turns = []
-        current = self.state.direction
+        current = (state or self.state).direction
         diff = (desired.value - current.value) % 4
         if diff == 1:
             turns.append(Action.TURN_RIGHT)
@@ -129,8 +113,8 @@ class Agent:
     # Get the direction to the target cell
     # Target cell is adjacent to the current cell
     # Returns the direction
-    def _direction_to(self, target_cell):
-        x, y = self.state.location
+    def _direction_to(self, target_cell, state: AgentState = None):
+        x, y = (state or self.state).location
         tx, ty = target_cell
         if tx == x - 1: return Direction.UP
         if tx == x + 1: return Direction.DOWN
@@ -145,19 +129,22 @@ class Agent:
     # all cells that are safe and not visited
     def _rank_cells(self, cells):
         ranked = []
+        # Ask the knowledge base about all cells at once
+        classified = self.kb.classify(cells)
+        scores = {}
         for cell in cells:
-            x, y = cell
-            h = self._heuristic(cell)
             rank = 0
 
             # Check the knowledge base for safety and hazards
-            safe = self.kb.is_safe(x, y)
-            possible_pit = not self.kb.is_not_pit(x, y)
-            posible_wumpus = not self.kb.is_not_wumpus(x, y)
-            possible_gas = not self.kb.is_not_gas(x, y)
-            possible_potion = not self.kb.is_not_potion(x, y)
+            flags = classified[cell]
+            safe = flags["safe"]
+            possible_pit = flags["pit"]
+            posible_wumpus = flags["wumpus"]
+            possible_gas = flags["gas"]
+            possible_potion = flags["potion"]
 
             if safe:
+                self.safe_cells.add(cell)
                 rank += 1000
             elif possible_pit:
                 rank += -1000
@@ -170,12 +157,18 @@ class Agent:
 
             if possible_potion:
                 rank += 100
-                
-            ranked.append((cell, rank - h))
 
-        return sorted(ranked, key=lambda x: x[1], reverse=True)
+            scores[cell] = rank
 
+        if self.max_risk is not None and not any(flags["safe"] for flags in classified.values()):
+            self._score_risks(classified, scores)
 
+        # Rank minus travel cost (moves + turns), from one sweep
+        travel = self._sweep_costs(scores)
+        for cell in cells:
+            ranked.append((cell, scores[cell] - travel[cell]))
+
+        return sorted(ranked, key=lambda x: x[1], reverse=True)
 
     # Find the best cell to move to based on the current knowledge base
     def _find_best_cell(self):
@@ -187,40 +180,145 @@ class Agent:
         
         ranked_cells = self._rank_cells(adj_cells)
 
-        # log ranked cells
-        self.log_lines.append(f"Ranked: {ranked_cells}")
-        self.log_maps["ranked"] = ranked_cells
-
-        for cell, rank in ranked_cells:
-            if cell not in self.visited and rank > 0:
-                print(f"Best cell to move to: {cell} with rank {rank}")
-                return cell
-        return None
+        best = next(((cell, rank) for cell, rank in ranked_cells if cell not in self.visited and rank > 0),
+                    (None, None))
+        self.events.emit(CellsRanked, ranked_cells, *best)
+        return best[0]
     
-    # Find path to best_cell
+    # Moves out of `cell` while facing `facing`: (neighbor, direction, cost),
+    # a move costing 1 plus the turns _get_turn_actions would emit for it
+    def _moves(self, cell, facing: Direction):
+        for direction, (dx, dy) in STEPS.items():
+            nx, ny = cell[0] + dx, cell[1] + dy
+            if 0 <= nx < self.size and 0 <= ny < self.size:
+                turns = (direction.value - facing.value) % 4
+                yield (nx, ny), direction, 1 + (2 if turns == 2 else min(turns, 1))
+
+    # Probabilistic mode: frontier cells that may be deadly, but only with a
+    # chance of at most max_risk, get a positive score (safer is higher,
+    # below a possible gas cell the agent can afford). Gas is deadly on 1 HP.
+    def _score_risks(self, classified, scores):
+        unsafe = [cell for cell, flags in classified.items()
+                  if flags["pit"] or flags["wumpus"] or (flags["gas"] and self.state.hp <= 1)]
+        probabilities = self.kb.hazard_probabilities(unsafe)
+        for cell in unsafe:
+            p = probabilities[cell]
+            survive = (1 - p["pit"]) * (1 - p["wumpus"])
+            if self.state.hp <= 1:
+                survive *= 1 - p["gas"]
+            risk = 1 - survive
+            if risk <= self.max_risk:
+                bonus = 100 if classified[cell]["potion"] else 0
+                scores[cell] = 50 + round(100 * (1 - risk / self.max_risk)) + bonus
+
+    # Dijkstra from the agent over the known-safe cells; frontier cells are
+    # reached but not passed through. `scores` holds the rank of each
+    # frontier cell before travel cost; the sweep stops as soon as no cell it
+    # has not reached could still match the best positive rank.
+    # Returns the travel cost of every cell in `scores`: exact for the cells
+    # reached, and a lower bound (Manhattan distance or the sweep's final
+    # cost, whichever is larger) for the rest. Parent pointers are kept for
+    # _find_path_to_best_cell.
+    def _sweep_costs(self, scores):
+        x, y = self.state.location
+        top = max(scores.values(), default=0)
+        start_state = (self.state.location, self.state.direction)
+        cost = {start_state: 0}
+        parent = {start_state: None}
+        best = {}
+        best_rank = 0
+        horizon = 0
+        heap = [(0, 0, start_state)] if top > 0 else []
+        pushed = 1
+
+        while heap:
+            g, _, state = heapq.heappop(heap)
+            if g > cost[state]:
+                continue
+            horizon = g
+            if top - g < best_rank:
+                break
+            cell = state[0]
+            if cell not in best:
+                best[cell] = state
+                if cell in scores:
+                    best_rank = max(best_rank, scores[cell] - g)
+            if state != start_state and cell not in self.safe_cells:
+                continue
+            for neighbor, direction, step_cost in self._moves(cell, state[1]):
+                if neighbor not in self.safe_cells and neighbor not in self.frontier:
+                    continue
+                next_state = (neighbor, direction)
+                next_g = g + step_cost
+                if next_g < cost.get(next_state, next_g + 1):
+                    cost[next_state] = next_g
+                    parent[next_state] = state
+                    heapq.heappush(heap, (next_g, pushed, next_state))
+                    pushed += 1
+        else:
+            # Searched everything: the cells not reached cannot be reached
+            if top > 0:
+                horizon = 4 * self.size * self.size
+
+        self._sweep = (start_state, parent, best)
+        travel = {}
+        for cell in scores:
+            if cell in best:
+                travel[cell] = cost[best[cell]]
+            else:
+                travel[cell] = max(abs(x - cell[0]) + abs(y - cell[1]), horizon)
+        return travel
+
+    def _trace_path(self, parent, state):
+        path = []
+        while state is not None:
+            path.append(state[0])
+            state = parent[state]
+        path.reverse()
+        return path[1:]
+
+    # Find path to best_cell. Cells ranked this step are read off the
+    # sweep; anything else gets an A* search over the known-safe cells (plus
+    # the goal itself) on (cell, direction) states, so turns cost what they
+    # cost when the path is walked. Returns the cells after the current one,
+    # or None. No solver calls either way.
     def _find_path_to_best_cell(self, best_cell):
-        # Simple BFS to find the path to the best cell
-        from collections import deque
-
         start = self.state.location
-        queue = deque([(start, [])])
-        visited = set()
-        
-        while queue:
-            current, path = queue.popleft()
-            if current == best_cell:
-                return path
-            
-            if current in visited:
+        if start == best_cell:
+            return None
+        start_state = (start, self.state.direction)
+        if self._sweep is not None and self._sweep[0] == start_state and best_cell in self._sweep[2]:
+            return self._trace_path(self._sweep[1], self._sweep[2][best_cell])
+
+        gx, gy = best_cell
+
+        def heuristic(cell):
+            return abs(cell[0] - gx) + abs(cell[1] - gy)
+
+        cost = {start_state: 0}
+        parent = {start_state: None}
+        # Entries carry a counter so ties never compare states
+        heap = [(heuristic(start), 0, 0, start_state)]
+        pushed = 1
+
+        while heap:
+            _, g, _, state = heapq.heappop(heap)
+            if g > cost[state]:
                 continue
-            
-            visited.add(current)
-            for neighbor in self._get_adjecent_cells(*current):
-                if neighbor not in visited and (neighbor in self.visited or self.kb.is_safe(*neighbor)):
-                    queue.append((neighbor, path + [neighbor]))
-                elif neighbor == best_cell:
-                    return path + [neighbor]
-        
+            if state[0] == best_cell:
+                return self._trace_path(parent, state)
+
+            for neighbor, direction, step_cost in self._moves(*state):
+                if neighbor != best_cell and neighbor not in self.safe_cells:
+                    continue
+                next_g = g + step_cost
+                next_state = (neighbor, direction)
+                if next_g < cost.get(next_state, next_g + 1):
+                    cost[next_state] = next_g
+                    parent[next_state] = state
+                    heapq.heappush(heap, (next_g + heuristic(neighbor), next_g, pushed, next_state))
+                    pushed += 1
+
         return None
 
     # Move from the current state to adjacent cells
@@ -237,36 +335,32 @@ class Agent:
                 actions.append(act)
             # Move to the target cell
             actions.append(Action.MOVE)
-            self.state.location = adjacent_cell
-            self.state.direction = direction
-            self.visited.add(adjacent_cell)
-            new_state = AgentState(location=adjacent_cell, hp=self.state.hp, potions=self.state.potions, score=self.state.score, direction=direction, arrows=self.state.arrows)
-        
+            self.state = self.state.replace(location=adjacent_cell, direction=direction)
+            self._mark_visited(adjacent_cell)
+
         return actions
         
-    # Gets all actions & states from the current state to the best cell
+    # Gets all actions & states from the current state to the best cell,
+    # worked out on snapshots without moving the agent
     def _get_actions_to_best_cell(self, best_cell):
         path = self._find_path_to_best_cell(best_cell)
         if not path:
             return []
-        
+
         actions = []
-        states = [current_state := self.state]
-        current = self.state.location
+        states = [self.state]
         for next_cell in path:
-            acts = self._move_to_adjacent_cells([next_cell])
-            if acts:
-                actions.extend(acts)
-                states.append(AgentState(location=next_cell, hp=current_state.hp, potions=current_state.potions, score=current_state.score, direction=current_state.direction, arrows=current_state.arrows))
-            else:
-                print(f"No safe path to {next_cell} from {current}")
-                return []
+            state = states[-1]
+            direction = self._direction_to(next_cell, state)
+            actions.extend(self._get_turn_actions(direction, state))
+            actions.append(Action.MOVE)
+            states.append(state.replace(location=next_cell, direction=direction))
         return actions, states
 
     # Find the wumpus to shoot
     def _find_wumpus_to_shoot(self):
         wumpus_cells = set()
-        for cell in self._get_all_visible_safe_cells():
+        for cell in self.frontier:
             if not self.kb.is_not_wumpus(*cell):
                 wumpus_cells.add(cell)
         if not wumpus_cells:
@@ -299,252 +393,192 @@ class Agent:
 
     def _shoot_wumpus(self, wumpus_cell):
         if self.state.arrows <= 0:
-            print("No arrows left to shoot!")
             return False
         
         # Find the best adjacent safe cell to shoot from
         best_adjacent_cell = self._get_adjacent_safe_cell_to_shoot(wumpus_cell)
+        self.events.emit(WumpusTargeted, wumpus_cell, best_adjacent_cell)
         if not best_adjacent_cell:
-            print("No adjacent safe cell to shoot from.")
             return False
         
         # Move to the best adjacent cell
-        if best_adjacent_cell == self.state.location:
-            print(f"Already at the best adjacent cell {best_adjacent_cell} to shoot.")                 
-        else:
+        if best_adjacent_cell != self.state.location:
             path = self._find_path_to_best_cell(best_adjacent_cell)
-            
-            # Log the path
-            self.log_maps["path"] = path
-            self.log_maps["best_adjacent_cell"] = best_adjacent_cell
-
+            self.events.emit(PathChosen, "shoot", best_adjacent_cell, path)
             if not path:
-                print(f"No safe path to {best_adjacent_cell}")
                 return False
-            
-            full_acts = []
 
             for step in path:
                 acts = self._move_to_adjacent_cell(step)
-                if acts:
-                    full_acts.extend(acts)
-                    self.actions.extend(acts)
-                    new_state = AgentState(location=step, hp=self.state.hp, potions=self.state.potions, score=self.state.score, direction=self.state.direction, arrows=self.state.arrows)
-                    
-                    # Log the action
-                    for act in acts:
-                        self.log_maps["actions"].append(act.name)
-                else:
-                    print(f"No safe path to {step} from {self.state.location}")
-                    return False
+                self._act(acts)
                 
         # Now we are at the best adjacent cell to shoot
         # Check if we are facing the wumpus
         if self.state.direction != self._direction_to(wumpus_cell):
             turns = self._get_turn_actions(self._direction_to(wumpus_cell))
-            self.state.direction = self._direction_to(wumpus_cell)
-            if turns:
-                # Log the turning actions
-                for turn in turns:
-                    self.log_maps["actions"].append(turn.name)
-                # Update the state after turning
-                for turn in turns:
-                    self.actions.append(turn)
-                    new_state = AgentState(location=self.state.location, hp=self.state.hp, potions=self.state.potions, score=self.state.score, arrows=self.state.arrows)
+            self.state = self.state.replace(direction=self._direction_to(wumpus_cell))
+            self._act(turns)
         
         # Now we are at the best adjacent cell and facing the wumpus
         # Shoot the wumpus
-        self.state.location = wumpus_cell
-        self.state.arrows -= 1
-        self.actions.append(Action.SHOOT)
-        self.visited.add(wumpus_cell)
-        self.actions.append(Action.MOVE)
-        # Update state after shooting
-        new_state = AgentState(location=wumpus_cell, hp=self.state.hp, potions=self.state.potions, score=self.state.score, arrows=self.state.arrows)
-        print(f"Shooting Wumpus at {wumpus_cell}, New State: {new_state}")
-
-        # Update knowledge base
-        # self.kb.add_not_object(Object.WUMPUS, *wumpus_cell)
-        # Remove wumpus from world
-        self.world.remove_wumpus(wumpus_cell[0], wumpus_cell[1])
+        self.state = self.state.replace(arrows=self.state.arrows - 1)
+        self._act([Action.SHOOT])
 
-        # Log the action
-        self.log_maps["actions"].append(Action.SHOOT.name)
-        self.log_maps["actions"].append(Action.MOVE.name)
-        self.log_maps["best_wumpus_cell"] = wumpus_cell
-        self.log_maps["events"].append(f"Shooting Wumpus at {wumpus_cell}")
+        # Remove wumpus from world, and its stench from the knowledge base
+        self.world.remove_wumpus(wumpus_cell[0], wumpus_cell[1])
+        self.kb.remove_wumpus(*wumpus_cell)
+        self.events.emit(HazardEvent, "shoot", wumpus_cell, self.state.hp)
+
+        # Logic-only mode steps into the cell it shot, as it always has. In
+        # probabilistic mode the cell stays on the frontier and is ranked
+        # with the others next step, risk of a pit or gas included.
+        if self.max_risk is None:
+            self.state = self.state.replace(location=wumpus_cell)
+            self._mark_visited(wumpus_cell)
+            self._act([Action.MOVE])
+
+    # Take actions: they join the run's action list and are announced
+    def _act(self, actions):
+        self.actions.extend(actions)
+        self.events.emit(ActionsTaken, actions)
+
+    # Hand one step record to the log sink
+    def _write_log(self, log_entry):
+        self.sink.write(log_entry)
+
+    # Close the timing of the previous step and start the next one
+    def _mark_step(self):
+        now = time.perf_counter()
+        if self._step_started is not None:
+            self.step_times.append(now - self._step_started)
+        self._step_started = now
 
     # def running the agent
     def run(self):
-        # Write initial state to log file
-
-        with open(self.output, "w") as jsonfile:  # Note jsonl extension
+        run_started = time.perf_counter()
+        if self.sink is None:
+            self.sink = make_sink(self.output, self.log_format, board_size=self.size)
+        # Step records are only built when they go somewhere
+        recorder = None
+        if not isinstance(self.sink, NullSink):
+            recorder = self.events.attach(StepRecorder(self._write_log))
+        try:
             while True:
-                # Print current state
+                self._mark_step()
+                if self.max_steps is not None and len(self.step_times) >= self.max_steps:
+                    self.outcome = "step_limit"
+                    self._step_started = None
+                    break
+                if self.time_limit is not None and self._step_started - run_started >= self.time_limit:
+                    self.outcome = "time_limit"
+                    self._step_started = None
+                    break
+
                 x, y = self.state.location
-                cur_location = self.state.location
-                cur_state = AgentState(location=cur_location, hp=self.state.hp, potions=self.state.potions, score=self.state.score, direction=self.state.direction, arrows=self.state.arrows)
-                print(f"Current Location: ({cur_location}), HP: {self.state.hp}, Potions: {self.state.potions}, Score: {self.state.score}, current direction: {self.state.direction}, arrows: {self.state.arrows}")
-                # reset log lines
-                self.reset_log()
-                # log current state
-
-                # Write current state to log file
+                self.step += 1
+                self.events.emit(StepStarted, self.step, self.state)
+
                 # 1. Perceive current cell
-                percepts = self.perceive(x, y)
+                self.perceive(x, y)
 
                 # 2. Handle immediate cell effects
+                # Only a gamble in probabilistic mode walks into these
+                for hazard, cause in [(Object.PIT, "pit"), (Object.WUMPUS, "wumpus")]:
+                    if self.world.has_object(hazard, x, y):
+                        self.events.emit(HazardEvent, cause, (x, y), self.state.hp)
+                        self.outcome = "died"
+                        self.death_cause = cause
+                        break
+                if self.outcome == "died":
+                    break
+
                 if self.world.has_object(Object.GOLD, x, y):
-                    self.state.score += 5000
-                    self.world.board[x][y]["gold"] = False
-                    print(f"Grabbed GOLD at ({x},{y})")
-                    # Log the action
-                    self.actions.append(Action.GRAB)
-                    self.log_maps["events"].append(f"Grabbed GOLD at ({x},{y})")
+                    self.state = self.state.replace(score=self.state.score + 5000)
+                    self.world.remove_object(Object.GOLD, x, y)
+                    self._act([Action.GRAB])
+                    self.events.emit(HazardEvent, "gold", (x, y), self.state.hp)
                 
                 if self.world.has_object(Object.POTION, x, y):
-                    self.state.potions += 1
-                    self.world.board[x][y]["potion"] = False
-                    print(f"Picked up POTION at ({x},{y})")
-                    # Log the action
-                    self.actions.append(Action.GRAB)
-                    self.log_maps["events"].append(f"Picked up POTION at ({x},{y})")
+                    self.state = self.state.replace(potions=self.state.potions + 1)
+                    self.world.remove_object(Object.POTION, x, y)
+                    self._act([Action.GRAB])
+                    self.events.emit(HazardEvent, "potion", (x, y), self.state.hp)
                 
                 if self.world.has_object(Object.GAS, x, y):
-                    self.state.hp -= 1
-                    print(f"Damaged by GAS at ({x},{y}), HP now {self.state.hp}")
+                    self.state = self.state.replace(hp=self.state.hp - 1)
+                    self.events.emit(HazardEvent, "gas", (x, y), self.state.hp)
                     if self.state.hp <= 0:
-                        print("Agent died due to GAS!")
+                        self.outcome = "died"
+                        self.death_cause = "gas"
                         break
                     # Remove gas from world
-                    self.world.board[x][y]["gas"] = False
+                    self.world.remove_object(Object.GAS, x, y)
                     # Add gas to knowledge base
                     self.kb.add_object(Object.GAS, x, y)
-                    # Log the action
-                    self.log_maps["events"].append(f"Damaged by GAS at ({x},{y}), HP now {self.state.hp}")
+                    self.events.emit(KnowledgeUpdated, (x, y), Object.GAS)
                     
                 # 3. Heal if needed
                 if self.state.hp <= 2 and self.state.potions > 0 and not self.world.has_object(Object.GAS, x, y):
-                    self.state.hp = 4
-                    self.state.potions -= 1
-                    print(f"Used POTION to heal at ({x},{y})")
-                    # Log the action
-                    self.log_maps["events"].append(f"Used POTION to heal at ({x},{y}), HP now {self.state.hp}")
+                    self.state = self.state.replace(hp=4, potions=self.state.potions - 1)
+                    self.events.emit(HazardEvent, "heal", (x, y), self.state.hp)
 
                 # 4. Mark visited
-                self.visited.add((x, y))
-                # Write visited cells to log file
-                self.log_maps["visited"] = list(self.visited)
+                self._mark_visited((x, y))
 
                 # 5. Choose next move
                 best_cell = self._find_best_cell()
 
-                # Log the best cell
-                self.log_maps["best"] = best_cell
-
                 # 6.1 If no best cell found, check if we can return to start or climb out
                 if not best_cell:
                     # If found possible wumpus, try to shoot it from it's adjacent cells
-                    print("Finding Wumpus to shoot...")
                     if self.state.arrows > 0:
                         wumpus_cells = self._find_wumpus_to_shoot()
                         best_wumpus_cell = self._find_best_wumpus_cell(wumpus_cells)
                         if best_wumpus_cell:
-                            print(f"Best Wumpus cell to shoot: {best_wumpus_cell}")
                             self._shoot_wumpus(best_wumpus_cell)
-                            # Write the actions to log file
-                            log_entry = self.parse_log(cur_state)
-                            json.dump(log_entry, jsonfile)
-                            jsonfile.write("\n")  # Write a newline for jsonl format
+                            self.events.emit(StepFinished, self.step, self.visited)
                             continue
-                    else:
-                        print("No arrows left to shoot Wumpus.")
-                                            
 
                     # No known safe unexplored frontier
-                    print("No safe cells left to explore.")
-                    if self.state.location == (9, 0):
-                        print("Climbing out from start position.")
-                        self.actions.append(Action.CLIMB)
+                    if self.state.location == self.start:
+                        self._act([Action.CLIMB])
+                        self.events.emit(HazardEvent, "climb", self.state.location, self.state.hp)
+                        self.outcome = "climbed"
                         break
                     else:
                         # Try to return to start
-                        path = self._find_path_to_best_cell((9, 0))
+                        path = self._find_path_to_best_cell(self.start)
                         if path:
-                            self.log_maps["path"] = path
+                            self.events.emit(PathChosen, "return", self.start, path)
                             for step in path:
-                                acts = self._move_to_adjacent_cell(step)
-                                full_acts = []
-                                if acts:
-                                    full_acts.extend(acts)
-                                    self.actions.extend(acts)
-                                    new_state = AgentState(location=step, hp=self.state.hp, potions=self.state.potions, score=self.state.score, direction=self.state.direction, arrows=self.state.arrows)
-                            # Log the actions taken
-                            for act in full_acts:
-                                self.log_maps["actions"].append(act.name)
-                        self.actions.append(Action.CLIMB)
-                        self.log_maps["events"].append("Climbing out from start position.")
-                        print("Climbing out from start position.")
-                        log_entry = self.parse_log(cur_state= cur_state)
-                        json.dump(log_entry, jsonfile)
-                        jsonfile.write("\n")  # Write a newline for jsonl format
+                                self._act(self._move_to_adjacent_cell(step))
+                        self._act([Action.CLIMB])
+                        self.events.emit(HazardEvent, "climb", self.state.location, self.state.hp)
+                        self.events.emit(StepFinished, self.step, self.visited)
+                        self.outcome = "climbed"
                         break
 
 
                 # 6.2 Plan path and move
                 path = self._find_path_to_best_cell(best_cell)
-                print(f"Best cell to move to: {best_cell}, Path: {path}")
-                # Log the path
-                self.log_maps["path"] = path
+                self.events.emit(PathChosen, "explore", best_cell, path)
                 if not path:
-                    print(f"No safe path to {best_cell}")
                     # If no path found, continue to next iteration
                     continue
                 
                 # Move to the best cell
-                full_acts = []
                 for step in path:
-                    acts = self._move_to_adjacent_cell(step)
-                    # Log the actions taken
-                    self.visited.add(step)
-                    full_acts.extend(acts)
-                    if acts:
-                        self.actions.extend(acts)
-                        new_state = AgentState(location=step, hp=self.state.hp, potions=self.state.potions, score=self.state.score, direction=self.state.direction, arrows=self.state.arrows)
-                        # break
-
-                # Log the actions taken
-                for act in full_acts:
-                    self.log_maps["actions"].append(act.name)
-
-                # Write the final state to json file
-                log_entry = self.parse_log(cur_state=cur_state)
-                json.dump(log_entry, jsonfile)
-                jsonfile.write("\n")  # Write a newline for jsonl format
-        
-        # Close the log files
-        jsonfile.close()
-
-        # Print board 
-        print("Final Board State:")
-        for i in range(10):
-            for j in range(10):
-                cell = self.world.board[i][j]
-                if cell.get("gold", False):
-                    print("G", end=" ")
-                elif cell.get("pit", False):
-                    print("P", end=" ")
-                elif cell.get("wumpus", False):
-                    print("W", end=" ")
-                elif cell.get("gas", False):
-                    print("g", end=" ")
-                elif cell.get("potion", False):
-                    print("p", end=" ")
-                elif (i, j) in self.visited:
-                    print("+", end=" ")
-                else:
-                    print("-", end=" ")
-            print()
-            
-
+                    self._act(self._move_to_adjacent_cell(step))
 
+                self.events.emit(StepFinished, self.step, self.visited)
+        
+        finally:
+            self._mark_step()
+            self._step_started = None
+            # Flush and close the log
+            if recorder is not None:
+                self.events.detach(recorder)
+            self.sink.close()
+
+        self.events.emit(RunEnded, self.outcome, self.death_cause, len(self.step_times),
+                         time.perf_counter() - run_started, self.world, self.visited)
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agent import Agent
+from const import World, AgentState
+from events import EventBus, RunMetrics
+from steplog import LOG_EXTENSIONS
+from test import BACKENDS, make_kb
+import mapio
+import worldgen
+
+MAP_EXTENSIONS = (".txt", ".bin", mapio.BUNDLE_EXTENSION)
+
+# The agent checks time_limit between steps, so one slow step can overrun
+# it. Workers also arm a timer that interrupts the run this many seconds
+# past the limit, mid-step if need be. Without SIGALRM (Windows) only the
+# between-step check applies, and a long native solver call finishes
+# before the interrupt lands.
+HARD_LIMIT_GRACE = 1.0
+
+
+class RunTimeout(Exception):
+    pass
+
+
+def _interrupt(signum, frame):
+    raise RunTimeout()
+
+
+# Map paths from a directory (every .txt/.bin/.wmaps file in it) or from a
+# manifest listing one path per line, relative to the manifest. A bundle,
+# given directly or found in either, stands for every map in it.
+def collect_maps(source: str):
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.endswith(MAP_EXTENSIONS))
+        paths = [os.path.join(source, n) for n in names]
+    elif mapio.is_bundle(source):
+        paths = [source]
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            lines = [line.strip() for line in f]
+        paths = [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+
+    maps = []
+    for path in paths:
+        if path.endswith(mapio.BUNDLE_EXTENSION):
+            maps.extend(mapio.open_bundle(path).paths())
+        else:
+            maps.append(path)
+    return maps
+
+
+def load_map(path: str):
+    if path.endswith(".bin"):
+        with open(path, "rb") as f:
+            return worldgen.from_bytes(f.read())
+    return mapio.load_map(path)
+
+
+# Log file names for `maps`, one per map. Names come from mapio.map_name;
+# maps sharing a name (same file name in two directories, the same map
+# listed twice, bundles with clashing names) get their index in `maps`
+# appended, so no run overwrites another's log.
+def log_names(maps, log_format: str):
+    names = [mapio.map_name(path) for path in maps]
+    counts = {}
+    for name in names:
+        counts[name] = counts.get(name, 0) + 1
+    taken = set(names)
+    unique = []
+    for index, name in enumerate(names):
+        if counts[name] > 1:
+            suffix = index
+            # A map may itself be called "<name>-<index>"
+            while f"{name}-{suffix}" in taken:
+                suffix += len(names)
+            name = f"{name}-{suffix}"
+            taken.add(name)
+        unique.append(name + LOG_EXTENSIONS[log_format])
+    return unique
+
+
+# Run one map in a worker process; every run gets its own KB
+def run_map(task):
+    path, backend, max_steps, time_limit, log_path, log_format, max_risk = task
+    began = time.perf_counter()
+    try:
+        board, start = load_map(path)
+        events = EventBus()
+        metrics = events.attach(RunMetrics())
+        agent = Agent(World(board), make_kb(len(board), backend), AgentState(location=start),
+                      max_steps=max_steps, time_limit=time_limit,
+                      log_format=log_format if log_path else "none", max_risk=max_risk, events=events)
+
+        if log_path:
+            agent.output = log_path
+        hard_limit = time_limit is not None and hasattr(signal, "setitimer")
+        if hard_limit:
+            previous = signal.signal(signal.SIGALRM, _interrupt)
+            signal.setitimer(signal.ITIMER_REAL, time_limit + HARD_LIMIT_GRACE)
+        try:
+            agent.run()
+        except RunTimeout:
+            agent.outcome = "time_limit"
+        finally:
+            if hard_limit:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+
+        return {
+            "map": path,
+            "size": len(board),
+            "score": agent.state.score,
+            "steps": len(agent.step_times),
+            "actions": len(agent.actions),
+            "outcome": agent.outcome,
+            "death_cause": agent.death_cause,
+            "hazards": metrics.hazards,
+            "wall_time": time.perf_counter() - began,
+        }
+    except Exception as e:
+        return {"map": path, "error": f"{type(e).__name__}: {e}", "wall_time": time.perf_counter() - began}
+
+
+def aggregate(results):
+    done = [r for r in results if "error" not in r]
+    outcomes = {}
+    for r in done:
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    return {
+        "maps": len(results),
+        "errors": len(results) - len(done),
+        "outcomes": outcomes,
+        "deaths": sum(1 for r in done if r["death_cause"]),
+        "score_mean": sum(r["score"] for r in done) / len(done) if done else 0.0,
+        "steps_mean": sum(r["steps"] for r in done) / len(done) if done else 0.0,
+        "wall_time_total": sum(r["wall_time"] for r in results),
+    }
+
+
+def run_batch(maps, backend: str = "propagation", workers: int = None, max_steps: int = None,
+              time_limit: float = None, log_dir: str = None, log_format: str = "full", max_risk: float = None):
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        log_paths = [os.path.join(log_dir, name) for name in log_names(maps, log_format)]
+    else:
+        log_paths = [None] * len(maps)
+    tasks = [(path, backend, max_steps, time_limit, log_path, log_format, max_risk)
+             for path, log_path in zip(maps, log_paths)]
+    workers = workers or os.cpu_count() or 1
+    # Hand out maps in chunks so workers are not starved on small runs
+    chunksize = max(1, len(tasks) // (workers * 16))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_map, tasks, chunksize=chunksize))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate the agent on many maps in parallel")
+    parser.add_argument("source", help="directory of maps, map bundle or manifest file")
+    parser.add_argument("--output", default="batch_summary.json")
+    parser.add_argument("--backend", choices=BACKENDS, default="propagation")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-steps", type=int, default=5000)
+    parser.add_argument("--time-limit", type=float, default=60.0, help="seconds per run; checked between steps, "
+                        f"and a run still going {HARD_LIMIT_GRACE:g}s later is interrupted")
+    parser.add_argument("--logs", help="keep the per-run step logs in this directory")
+    parser.add_argument("--log-format", choices=["full", "delta", "binary"], default="delta")
+    parser.add_argument("--max-risk", type=float, default=None,
+                        help="probabilistic mode: accept frontier cells up to this chance of death")
+    args = parser.parse_args(argv)
+
+    maps = collect_maps(args.source)
+    began = time.perf_counter()
+    results = run_batch(maps, args.backend, args.workers, args.max_steps, args.time_limit, args.logs,
+                        args.log_format, args.max_risk)
+    summary = aggregate(results)
+    summary["elapsed"] = time.perf_counter() - began
+
+    with open(args.output, "w") as f:
+        json.dump({"backend": args.backend, "max_risk": args.max_risk, "summary": summary, "runs": results}, f, indent=2)
+    print(f"{summary['maps']} maps in {summary['elapsed']:.1f}s -> {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from agent import Agent
+from const import World, AgentState
+from profiler import Profiler
+from test import BACKENDS, make_kb
+from worldgen import generate_world, hazard_counts
+
+# KB methods counted as queries; everything else that adds facts is an update
+QUERY_METHODS = {"is_safe", "is_not_pit", "is_not_wumpus", "is_not_gas", "is_not_potion", "is_sure_object"}
+UPDATE_METHODS = {"add_initial_state", "assume_safe", "add_object", "add_not_object", "add_percepts"}
+
+
+# Wraps a knowledge base and times every query/update made through it
+class TimedKB:
+    def __init__(self, kb):
+        self._kb = kb
+        self.size = kb.size
+        self.kb_time = 0.0
+        self.queries = 0
+        self.updates = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._kb, name)
+        if name == "classify":
+            def timed(cells):
+                cells = list(cells)
+                self.queries += len(cells)
+                return self._timed(attr, cells)
+            return timed
+        if name in QUERY_METHODS or name in UPDATE_METHODS:
+            def timed(*args):
+                if name in QUERY_METHODS:
+                    self.queries += 1
+                else:
+                    self.updates += 1
+                return self._timed(attr, *args)
+            return timed
+        return attr
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.kb_time += time.perf_counter() - start
+
+
+def percentile(values, q: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_stats(values):
+    return {
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+        "mean": sum(values) / len(values) if values else 0.0,
+    }
+
+
+def run_one(size: int, density: float, seed: int, backend: str, max_steps: int,
+            profile: bool = False, log_format: str = "none"):
+    board, start = generate_world(size, seed, potions=1, **hazard_counts(size, density))
+    kb = TimedKB(make_kb(size, backend))
+    agent = Agent(World(board), kb, AgentState(location=start),
+                  output=f"output/bench_{size}_{density}_{seed}",
+                  max_steps=max_steps, log_format=log_format)
+    profiler = Profiler().attach(agent, kb=kb._kb) if profile else None
+
+    began = time.perf_counter()
+    agent.run()
+    wall = time.perf_counter() - began
+
+    run = {
+        "size": size,
+        "density": density,
+        "seed": seed,
+        "steps": len(agent.step_times),
+        "actions": len(agent.actions),
+        "visited": len(agent.visited),
+        "score": agent.state.score,
+        "hp": agent.state.hp,
+        "alive": agent.outcome != "died",
+        "wall_time": wall,
+        "step_latency": latency_stats(agent.step_times),
+        "kb_time": kb.kb_time,
+        "kb_queries": kb.queries,
+        "kb_updates": kb.updates,
+    }
+    if profiler:
+        run["phases"] = profiler.report()["phases"]
+    return run
+
+
+def summarize(runs):
+    groups = {}
+    for run in runs:
+        groups.setdefault((run["size"], run["density"]), []).append(run)
+
+    summary = []
+    for (size, density), group in sorted(groups.items()):
+        latencies = [r["step_latency"]["p50"] for r in group]
+        summary.append({
+            "size": size,
+            "density": density,
+            "runs": len(group),
+            "steps_mean": sum(r["steps"] for r in group) / len(group),
+            "score_mean": sum(r["score"] for r in group) / len(group),
+            "wall_time_total": sum(r["wall_time"] for r in group),
+            "kb_time_total": sum(r["kb_time"] for r in group),
+            "kb_queries_total": sum(r["kb_queries"] for r in group),
+            "step_p50_median": percentile(latencies, 50),
+            "step_p99_max": max(r["step_latency"]["p99"] for r in group),
+        })
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Print how each (size, density) group moved against an earlier report
+def compare(report, baseline):
+    old = {(s["size"], s["density"]): s for s in baseline["summary"]}
+    for s in report["summary"]:
+        prev = old.get((s["size"], s["density"]))
+        if not prev:
+            continue
+        for key in ["step_p50_median", "step_p99_max", "kb_time_total", "score_mean"]:
+            before, after = prev[key], s[key]
+            ratio = f"{after / before:.2f}x" if before else "n/a"
+            print(f"size={s['size']} density={s['density']} {key}: {before:.6g} -> {after:.6g} ({ratio})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent on seeded random worlds")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 16, 32])
+    parser.add_argument("--densities", type=float, nargs="+", default=[0.05, 0.1, 0.2])
+    parser.add_argument("--seeds", type=int, default=3, help="worlds per (size, density)")
+    parser.add_argument("--backend", choices=BACKENDS, default="propagation")
+    parser.add_argument("--max-steps", type=int, default=5000)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    parser.add_argument("--profile", action="store_true", help="add per-phase timings to every run")
+    parser.add_argument("--log-format", choices=["none", "full", "delta", "binary"], default="none",
+                        help="step log written to output/ (none = no log I/O)")
+    args = parser.parse_args(argv)
+
+    runs = []
+    for size in args.sizes:
+        for density in args.densities:
+            for seed in range(args.seeds):
+                run = run_one(size, density, seed, args.backend, args.max_steps, args.profile, args.log_format)
+                runs.append(run)
+                print(f"size={size} density={density} seed={seed} steps={run['steps']} "
+                      f"score={run['score']} wall={run['wall_time']:.3f}s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "backend": args.backend,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "max_steps": args.max_steps,
+        },
+        "runs": runs,
+        "summary": summarize(runs),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import mmap
+import struct
+
+from const import Action, Direction
+
+# Binary step trace
+#
+#   header   magic "WTRC", version, cell width (2 or 4 bytes), board size
+#   records  one per step, back to back (layout in TraceEncoder.encode)
+#   visits   u32 count + every visited cell in first-visit order
+#   index    u64 byte offset of every record (fixed size, so step i is one lookup)
+#   trailer  offset of the visits section, offset of the index, step count, "WEND"
+#
+# Cells are packed as one integer x * size + y. A record does not repeat the
+# visited list: it stores how many cells had been visited by then, and the
+# reader slices that many cells off the shared visit order.
+MAGIC = b"WTRC"
+END_MAGIC = b"WEND"
+VERSION = 1
+HEADER = struct.Struct("<4sBBH")
+TRAILER = struct.Struct("<QQI4s")
+STATE = struct.Struct("<IhHiBHI")   # step, hp, potions, score, direction, arrows, visited count
+COUNT = struct.Struct("<I")
+RANK = struct.Struct("<i")
+NULL_LIST = 0xFFFFFFFF
+
+ACTIONS = [action.name for action in Action]
+DIRECTIONS = [direction.name for direction in sorted(Direction, key=lambda d: d.value)]
+
+
+class TraceEncoder:
+    def __init__(self, board_size: int):
+        self.size = board_size
+        self.cell_width = 2 if board_size * board_size < 0xFFFF else 4
+        self._cell = "H" if self.cell_width == 2 else "I"
+        self._none = (1 << (8 * self.cell_width)) - 1
+        self._position = HEADER.size
+        self._offsets = []
+        self._order = []
+        self._seen = set()
+
+    def header(self):
+        return HEADER.pack(MAGIC, VERSION, self.cell_width, self.size)
+
+    def _pack_cell(self, cell):
+        if cell is None:
+            return self._none
+        return cell[0] * self.size + cell[1]
+
+    def _cells(self, cells):
+        if cells is None:
+            return COUNT.pack(NULL_LIST)
+        return COUNT.pack(len(cells)) + struct.pack(f"<{len(cells)}{self._cell}", *map(self._pack_cell, cells))
+
+    def encode(self, record):
+        for cell in record.get("visited", []):
+            cell = tuple(cell)
+            if cell not in self._seen:
+                self._seen.add(cell)
+                self._order.append(cell)
+
+        ranked = record.get("ranked", [])
+        parts = [
+            STATE.pack(record["step"], record["hp"], record["potions"], record["score"],
+                       Direction[record["direction"]].value, record["arrows"], len(self._order)),
+            struct.pack(f"<4{self._cell}", *map(self._pack_cell, [
+                record.get("location"), record.get("best"),
+                record.get("best_wumpus_cell"), record.get("best_adjacent_cell")])),
+            self._cells(record.get("wumpus", [])),
+            self._cells(record.get("adjacent_safe_cells", [])),
+            self._cells(record.get("path", [])),
+            self._cells([cell for cell, _ in ranked]),
+            struct.pack(f"<{len(ranked)}i", *(rank for _, rank in ranked)),
+            COUNT.pack(len(record.get("actions", []))),
+            bytes(ACTIONS.index(action) for action in record.get("actions", [])),
+            COUNT.pack(len(record.get("events", []))),
+        ]
+        for event in record.get("events", []):
+            text = event.encode("utf-8")
+            parts.append(struct.pack("<H", len(text)) + text)
+
+        data = b"".join(parts)
+        self._offsets.append(self._position)
+        self._position += len(data)
+        return data
+
+    def footer(self):
+        visits_offset = self._position
+        visits = self._cells(self._order)
+        index_offset = visits_offset + len(visits)
+        index = struct.pack(f"<{len(self._offsets)}Q", *self._offsets)
+        return visits + index + TRAILER.pack(visits_offset, index_offset, len(self._offsets), END_MAGIC)
+
+
+# Memory-mapped reader: opening reads only the header and trailer, and each
+# step is decoded when it is indexed
+class TraceReader:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.cell_width, self.size = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a binary step trace")
+        self._visits_offset, self._index_offset, self._count, end = \
+            TRAILER.unpack_from(self._mm, len(self._mm) - TRAILER.size)
+        if end != END_MAGIC:
+            raise ValueError("Truncated step trace (the writer was not closed)")
+        self._cell = "H" if self.cell_width == 2 else "I"
+        self._none = (1 << (8 * self.cell_width)) - 1
+
+    def __len__(self):
+        return self._count
+
+    def _unpack_cell(self, value):
+        if value == self._none:
+            return None
+        return list(divmod(value, self.size))
+
+    def _read_cells(self, offset: int):
+        count, = COUNT.unpack_from(self._mm, offset)
+        offset += COUNT.size
+        if count == NULL_LIST:
+            return None, offset
+        values = struct.unpack_from(f"<{count}{self._cell}", self._mm, offset)
+        return [list(divmod(v, self.size)) for v in values], offset + count * self.cell_width
+
+    def visited(self, count: int):
+        values = struct.unpack_from(f"<{count}{self._cell}", self._mm, self._visits_offset + COUNT.size)
+        return [list(divmod(v, self.size)) for v in values]
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+
+        offset, = struct.unpack_from("<Q", self._mm, self._index_offset + 8 * index)
+        step, hp, potions, score, direction, arrows, visited = STATE.unpack_from(self._mm, offset)
+        offset += STATE.size
+        location, best, best_wumpus, best_adjacent = map(
+            self._unpack_cell, struct.unpack_from(f"<4{self._cell}", self._mm, offset))
+        offset += 4 * self.cell_width
+
+        wumpus, offset = self._read_cells(offset)
+        adjacent_safe, offset = self._read_cells(offset)
+        path, offset = self._read_cells(offset)
+        ranked_cells, offset = self._read_cells(offset)
+        ranks = struct.unpack_from(f"<{len(ranked_cells)}i", self._mm, offset)
+        offset += RANK.size * len(ranked_cells)
+
+        count, = COUNT.unpack_from(self._mm, offset)
+        offset += COUNT.size
+        actions = [ACTIONS[code] for code in self._mm[offset:offset + count]]
+        offset += count
+
+        count, = COUNT.unpack_from(self._mm, offset)
+        offset += COUNT.size
+        events = []
+        for _ in range(count):
+            length, = struct.unpack_from("<H", self._mm, offset)
+            offset += 2
+            events.append(self._mm[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        return {
+            "step": step,
+            "location": location,
+            "hp": hp,
+            "potions": potions,
+            "score": score,
+            "direction": DIRECTIONS[direction],
+            "arrows": arrows,
+            "visited": self.visited(visited),
+            "ranked": [[cell, rank] for cell, rank in zip(ranked_cells, ranks)],
+            "best": best,
+            "wumpus": wumpus,
+            "best_wumpus_cell": best_wumpus,
+            "adjacent_safe_cells": adjacent_safe,
+            "best_adjacent_cell": best_adjacent,
+            "path": path,
+            "actions": actions,
+            "events": events,
+        }
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def is_trace(path: str):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import NamedTuple
 
 ### --- CONSTANTS & ENUMS --- ###
 class Percept(Enum):
@@ -32,26 +33,70 @@ class Direction(Enum):
     LEFT = 3
 
 ### --- WORLD --- ###
+# Board keys of the objects and percepts a World keeps a plane for
+OBJECT_KEYS = {obj: obj.value.lower() for obj in Object}
+PERCEPT_KEYS = {
+    Percept.STENCH: "stench",
+    Percept.BREEZE: "breeze",
+    Percept.WHIFF: "whiff",
+    Percept.GLOW: "glow",
+}
+PLANES = tuple(OBJECT_KEYS.values()) + tuple(PERCEPT_KEYS.values())
+
 class World:
+    # One plane per object and percept: a bytearray with cell (x, y) at
+    # x * size + y, 1 where the object/percept is. Lookups are plain
+    # indexing; whole-board work can treat a plane as one integer with a
+    # byte per cell (int.from_bytes) and use shifts and masks.
     def __init__(self, board):
-        self.board = board
+        size = len(board)
+        planes = {name: bytearray(size * size) for name in PLANES}
+        for i, row in enumerate(board):
+            for j, cell in enumerate(row):
+                for name, value in cell.items():
+                    if value and name in planes:
+                        planes[name][i * size + j] = 1
+        self._setup(size, planes)
+
+    # Build a World straight from planes (bytes-like, size*size long).
+    # Percept planes that are not given are derived from the object planes
+    @classmethod
+    def from_planes(cls, size: int, planes):
+        planes = dict(percept_planes(planes, size), **planes)
+        world = cls.__new__(cls)
+        world._setup(size, {name: bytearray(planes[name]) if name in planes else bytearray(size * size)
+                            for name in PLANES})
+        return world
+
+    def _setup(self, size: int, planes):
+        self.size = size
+        self.planes = planes
+        self._percepts = [(percept, planes[name]) for percept, name in PERCEPT_KEYS.items()]
+
+    # The board as the nested list of per-cell dicts the loaders produce
+    def to_board(self):
+        board = [[{} for _ in range(self.size)] for _ in range(self.size)]
+        for name, plane in self.planes.items():
+            _mark(board, name, plane)
+        return board
 
     def percept_at(self, x: int, y: int):
-        percepts = []
-        if self.board[x][y].get("stench", False): percepts.append(Percept.STENCH)
-        if self.board[x][y].get("breeze", False): percepts.append(Percept.BREEZE)
-        if self.board[x][y].get("whiff", False): percepts.append(Percept.WHIFF)
-        if self.board[x][y].get("glow", False): percepts.append(Percept.GLOW)
+        index = x * self.size + y
+        percepts = [percept for percept, plane in self._percepts if plane[index]]
         return percepts if percepts else [Percept.NONE]
 
     def has_object(self, obj: Object, x: int, y: int):
-        return self.board[x][y].get(obj.value.lower(), False)
+        return self.planes[OBJECT_KEYS[obj]][x * self.size + y] == 1
+
+    # Take an object off a cell; the percepts around it are left as they are
+    def remove_object(self, obj: Object, x: int, y: int):
+        self.planes[OBJECT_KEYS[obj]][x * self.size + y] = 0
     
     def _adjacent_cells(self, x: int, y: int):
         adjacent = []
         for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
             nx, ny = x + dx, y + dy
-            if 0 <= nx < len(self.board) and 0 <= ny < len(self.board[0]):
+            if 0 <= nx < self.size and 0 <= ny < self.size:
                 adjacent.append((nx, ny))
         return adjacent
 
@@ -59,38 +104,127 @@ class World:
         adjacent = self._adjacent_cells(x, y)
         has_wumpus = any(self.has_object(Object.WUMPUS, cell[0], cell[1]) for cell in adjacent)
         if not has_wumpus:
-            self.board[x][y]["stench"] = False
+            self.planes["stench"][x * self.size + y] = 0
+
+    # Rebuild a percept field from its object plane
+    def _refresh_field(self, obj: str):
+        self.planes[PERCEPT_FIELDS[obj]][:] = spread(self.planes[obj], self.size)
 
     def remove_wumpus(self, x: int, y: int):
-        if self.has_object(Object.WUMPUS, x, y):
-            self.board[x][y]["wumpus"] = False
-        adjacent = self._adjacent_cells(x, y)
-        for cell in adjacent:
-            self.remove_stench(cell[0], cell[1])
+        self.remove_object(Object.WUMPUS, x, y)
+        self._refresh_field("wumpus")
 
     def remove_whiff(self, x: int, y: int):
         adjacent = self._adjacent_cells(x, y)
         has_gas = any(self.has_object(Object.GAS, cell[0], cell[1]) for cell in adjacent)
         if not has_gas:
-            self.board[x][y]["whiff"] = False
+            self.planes["whiff"][x * self.size + y] = 0
     
     def remove_gas(self, x: int, y: int):
-        if self.has_object(Object.GAS, x, y):
-            self.board[x][y]["gas"] = False
-        adjacent = self._adjacent_cells(x, y)
-        for cell in adjacent:
-            self.remove_whiff(cell[0], cell[1])
+        self.remove_object(Object.GAS, x, y)
+        self._refresh_field("gas")
                 
     
+# Percept left on the four neighbours of each hazard
+PERCEPT_FIELDS = {
+    "wumpus": "stench",
+    "pit": "breeze",
+    "gas": "whiff",
+    "potion": "glow",
+}
+
+_lane_masks = {}
+
+# Byte-lane masks for a size x size plane: every cell, every cell but the
+# last column, every cell but the first column
+def _masks(size: int):
+    masks = _lane_masks.get(size)
+    if masks is None:
+        n = size * size
+        masks = (
+            int.from_bytes(b"\x01" * n, "little"),
+            int.from_bytes((b"\x01" * (size - 1) + b"\x00") * size, "little"),
+            int.from_bytes((b"\x00" + b"\x01" * (size - 1)) * size, "little"),
+        )
+        _lane_masks[size] = masks
+    return masks
+
+# Cells next to any marked cell of a plane (one byte per cell, 0 or 1), as a
+# plane of the same layout. The plane is read as one integer with a byte per
+# cell, so the four neighbours are four shifts OR-ed together; column masks
+# stop a shift from wrapping into the next row.
+def spread(plane, size: int):
+    cells, not_last, not_first = _masks(size)
+    bits = int.from_bytes(plane, "little")
+    row = 8 * size
+    field = (bits << row) | (bits >> row) | ((bits & not_last) << 8) | ((bits & not_first) >> 8)
+    return (field & cells).to_bytes(size * size, "little")
+
+# Indices of the marked cells of a plane
+def marked(plane):
+    index = plane.find(1)
+    while index != -1:
+        yield index
+        index = plane.find(1, index + 1)
+
+# Percept planes around the hazards of `objects` ({object: plane})
+def percept_planes(objects, size: int):
+    return {percept: spread(objects[obj], size)
+            for obj, percept in PERCEPT_FIELDS.items() if obj in objects}
+
+
+def _mark(board, name: str, plane):
+    size = len(board)
+    for index in marked(plane):
+        board[index // size][index % size][name] = True
+
+
+# Board of per-cell dicts from object planes, percepts included; the loaders
+# build planes while parsing and only touch the dicts of non-empty cells
+def board_from_planes(size: int, objects):
+    board = [[{} for _ in range(size)] for _ in range(size)]
+    for obj, plane in objects.items():
+        _mark(board, obj, plane)
+    for percept, plane in percept_planes(objects, size).items():
+        _mark(board, percept, plane)
+    return board
+
+
+# Fill in stench/breeze/whiff/glow around every object of the board
+def place_percepts(board):
+    size = len(board)
+    objects = {obj: bytearray(size * size) for obj in PERCEPT_FIELDS}
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            if cell:
+                for obj, plane in objects.items():
+                    if cell.get(obj, False):
+                        plane[i * size + j] = 1
+    for percept, plane in percept_planes(objects, size).items():
+        _mark(board, percept, plane)
+    return board
+
+
 ### --- AGENT STATE --- ###
-class AgentState:
-    def __init__(self, location=(0, 0), hp=3, potions=0, score=0, direction=Direction.UP, arrows=1):
-        self.location = location
-        self.hp = hp
-        self.potions = potions
-        self.score = score
-        self.direction = direction # Direction the agent is facing
-        self.arrows = arrows
+# Immutable record: a change is a new state from replace(), which shares
+# every field with the old one, so keeping a state for a log record or a
+# lookahead is just keeping a reference
+class AgentState(NamedTuple):
+    location: tuple = (0, 0)
+    hp: int = 3
+    potions: int = 0
+    score: int = 0
+    direction: Direction = Direction.UP # Direction the agent is facing
+    arrows: int = 1
+
+    # Copy with the given fields changed (None keeps a field)
+    def replace(self, location=None, hp=None, potions=None, score=None, direction=None, arrows=None):
+        return AgentState(self.location if location is None else location,
+                          self.hp if hp is None else hp,
+                          self.potions if potions is None else potions,
+                          self.score if score is None else score,
+                          self.direction if direction is None else direction,
+                          self.arrows if arrows is None else arrows)
 
     def __str__(self):
         return f"Location: {self.location}, Direction: {self.direction}, HP: {self.hp}, Potions: {self.potions}, Score: {self.score}, Arrows: {self.arrows}"
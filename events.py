@@ -0,0 +1,350 @@
+from const import Object
+
+# Typed events the agent emits while it runs, and the subscribers that turn
+# them into console output, step log records and metrics.
+#
+#   bus = EventBus()
+#   bus.attach(ConsoleReporter())
+#   agent = Agent(world, kb, state, events=bus)
+#
+# emit() looks up the handlers of an event type before building the event,
+# so an event nobody subscribed to costs one dict lookup: no event object,
+# no formatting. Events hand over the agent's own objects (the visited set,
+# the ranked list); handlers must not mutate them.
+
+
+### --- EVENTS --- ###
+class Event:
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+# A decision step begins; `state` is the agent state it starts from
+class StepStarted(Event):
+    __slots__ = ("step", "state")
+
+    def __init__(self, step, state):
+        self.step = step
+        self.state = state
+
+
+# Percepts of the cell the agent stands on
+class Perceived(Event):
+    __slots__ = ("cell", "percepts")
+
+    def __init__(self, cell, percepts):
+        self.cell = cell
+        self.percepts = percepts
+
+
+# Something was told to the knowledge base: the percepts of a cell, or an
+# object found in it
+class KnowledgeUpdated(Event):
+    __slots__ = ("cell", "fact")
+
+    def __init__(self, cell, fact):
+        self.cell = cell
+        self.fact = fact
+
+
+# Frontier cells ranked best first as (cell, rank), and the cell picked
+# (None when no rank is positive)
+class CellsRanked(Event):
+    __slots__ = ("ranked", "best", "rank")
+
+    def __init__(self, ranked, best, rank):
+        self.ranked = ranked
+        self.best = best
+        self.rank = rank
+
+
+# A possible wumpus picked for a shot, and the safe neighbour to shoot it
+# from (None when there is none)
+class WumpusTargeted(Event):
+    __slots__ = ("cell", "shoot_from")
+
+    def __init__(self, cell, shoot_from):
+        self.cell = cell
+        self.shoot_from = shoot_from
+
+
+# A path planned towards `target`; `path` is empty or None when there is no
+# safe path. purpose: "explore", "shoot" or "return".
+class PathChosen(Event):
+    __slots__ = ("purpose", "target", "path")
+
+    def __init__(self, purpose, target, path):
+        self.purpose = purpose
+        self.target = target
+        self.path = path
+
+
+# Actions the agent took, in order
+class ActionsTaken(Event):
+    __slots__ = ("actions",)
+
+    def __init__(self, actions):
+        self.actions = actions
+
+
+# Something happened to the agent at `cell`: kind is one of HAZARD_MESSAGES
+class HazardEvent(Event):
+    __slots__ = ("kind", "cell", "hp")
+
+    def __init__(self, kind, cell, hp):
+        self.kind = kind
+        self.cell = cell
+        self.hp = hp
+
+    def message(self):
+        x, y = self.cell
+        return HAZARD_MESSAGES[self.kind].format(x=x, y=y, cell=self.cell, hp=self.hp)
+
+
+HAZARD_MESSAGES = {
+    "gold": "Grabbed GOLD at ({x},{y})",
+    "potion": "Picked up POTION at ({x},{y})",
+    "gas": "Damaged by GAS at ({x},{y}), HP now {hp}",
+    "heal": "Used POTION to heal at ({x},{y}), HP now {hp}",
+    "shoot": "Shooting Wumpus at {cell}",
+    "climb": "Climbing out from start position.",
+    "pit": "Agent fell to a PIT at ({x},{y})!",
+    "wumpus": "Agent fell to a WUMPUS at ({x},{y})!",
+}
+
+
+# A step is complete and goes into the step log
+class StepFinished(Event):
+    __slots__ = ("step", "visited")
+
+    def __init__(self, step, visited):
+        self.step = step
+        self.visited = visited
+
+
+# The run is over: outcome and death cause as on the agent
+class RunEnded(Event):
+    __slots__ = ("outcome", "death_cause", "steps", "elapsed", "world", "visited")
+
+    def __init__(self, outcome, death_cause, steps, elapsed, world, visited):
+        self.outcome = outcome
+        self.death_cause = death_cause
+        self.steps = steps
+        self.elapsed = elapsed
+        self.world = world
+        self.visited = visited
+
+
+### --- BUS --- ###
+class EventBus:
+    def __init__(self):
+        self._handlers = {}
+
+    def subscribe(self, event_type, handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+        return handler
+
+    def unsubscribe(self, event_type, handler):
+        handlers = self._handlers.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._handlers.pop(event_type, None)
+
+    # Subscribe every handler of a subscriber ({event type: handler})
+    def attach(self, subscriber):
+        for event_type, handler in subscriber.handlers().items():
+            self.subscribe(event_type, handler)
+        return subscriber
+
+    def detach(self, subscriber):
+        for event_type, handler in subscriber.handlers().items():
+            self.unsubscribe(event_type, handler)
+
+    def wants(self, event_type):
+        return event_type in self._handlers
+
+    def emit(self, event_type, *fields):
+        handlers = self._handlers.get(event_type)
+        if handlers:
+            event = event_type(*fields)
+            for handler in handlers:
+                handler(event)
+
+
+### --- SUBSCRIBERS --- ###
+# The agent's running commentary on stdout
+class ConsoleReporter:
+    def __init__(self, board: bool = True):
+        self.board = board   # print the final board when the run ends
+
+    def handlers(self):
+        return {
+            StepStarted: self.step_started,
+            CellsRanked: self.cells_ranked,
+            WumpusTargeted: self.wumpus_targeted,
+            PathChosen: self.path_chosen,
+            HazardEvent: self.hazard,
+            RunEnded: self.run_ended,
+        }
+
+    def step_started(self, event):
+        state = event.state
+        print(f"Current Location: ({state.location}), HP: {state.hp}, Potions: {state.potions}, "
+              f"Score: {state.score}, current direction: {state.direction}, arrows: {state.arrows}")
+
+    def cells_ranked(self, event):
+        if event.best is not None:
+            print(f"Best cell to move to: {event.best} with rank {event.rank}")
+
+    def wumpus_targeted(self, event):
+        print(f"Best Wumpus cell to shoot: {event.cell}")
+        if event.shoot_from is None:
+            print("No adjacent safe cell to shoot from.")
+
+    def path_chosen(self, event):
+        if event.purpose == "explore":
+            print(f"Best cell to move to: {event.target}, Path: {event.path}")
+        if not event.path:
+            print(f"No safe path to {event.target}")
+
+    def hazard(self, event):
+        print(event.message())
+
+    def run_ended(self, event):
+        if event.outcome == "step_limit":
+            print(f"Stopping after {event.steps} steps.")
+        elif event.outcome == "time_limit":
+            print(f"Stopping after {event.elapsed:.1f} seconds.")
+        elif event.outcome == "died" and event.death_cause == "gas":
+            print("Agent died due to GAS!")
+        if self.board:
+            print_board(event.world, event.visited)
+
+
+def print_board(world, visited):
+    print("Final Board State:")
+    symbols = [(Object.GOLD, "G"), (Object.PIT, "P"), (Object.WUMPUS, "W"), (Object.GAS, "g"), (Object.POTION, "p")]
+    for i in range(world.size):
+        row = []
+        for j in range(world.size):
+            symbol = next((s for obj, s in symbols if world.has_object(obj, i, j)), None)
+            row.append(symbol or ("+" if (i, j) in visited else "-"))
+        print(" ".join(row))
+
+
+# Builds the step log records (the format steplog encodes) from the events
+# of each step and hands every finished step to `write`
+class StepRecorder:
+    def __init__(self, write):
+        self.write = write
+        self._record = None
+
+    def handlers(self):
+        return {
+            StepStarted: self.step_started,
+            CellsRanked: self.cells_ranked,
+            PathChosen: self.path_chosen,
+            ActionsTaken: self.actions_taken,
+            HazardEvent: self.hazard,
+            StepFinished: self.step_finished,
+        }
+
+    def step_started(self, event):
+        state = event.state
+        self._record = {
+            "step": event.step,
+            "location": state.location,
+            "hp": state.hp,
+            "potions": state.potions,
+            "score": state.score,
+            "direction": state.direction.name,
+            "arrows": state.arrows,
+            "visited": None,
+            "ranked": [],
+            "best": None,
+            "wumpus": [],
+            "best_wumpus_cell": None,
+            "adjacent_safe_cells": [],
+            "best_adjacent_cell": None,
+            "path": [],
+            "actions": [],
+            "events": [],
+        }
+
+    def cells_ranked(self, event):
+        self._record["ranked"] = event.ranked
+        self._record["best"] = event.best
+
+    def path_chosen(self, event):
+        self._record["path"] = event.path
+        if event.purpose == "shoot":
+            self._record["best_adjacent_cell"] = event.target
+
+    def actions_taken(self, event):
+        self._record["actions"].extend(action.name for action in event.actions)
+
+    def hazard(self, event):
+        if event.kind == "shoot":
+            self._record["best_wumpus_cell"] = event.cell
+        self._record["events"].append(event.message())
+
+    # Records go to the sink as they are, and a new one starts every step
+    def step_finished(self, event):
+        self._record["visited"] = list(event.visited)
+        self.write(self._record)
+
+
+# Counts of what happened over a run
+class RunMetrics:
+    def __init__(self):
+        self.steps = 0
+        self.actions = {}
+        self.hazards = {}
+        self.paths = 0
+        self.path_cells = 0
+        self.no_path = 0
+        self.kb_updates = 0
+
+    def handlers(self):
+        return {
+            StepStarted: self.step_started,
+            KnowledgeUpdated: self.knowledge_updated,
+            PathChosen: self.path_chosen,
+            ActionsTaken: self.actions_taken,
+            HazardEvent: self.hazard,
+        }
+
+    def step_started(self, event):
+        self.steps += 1
+
+    def knowledge_updated(self, event):
+        self.kb_updates += 1
+
+    def path_chosen(self, event):
+        if event.path:
+            self.paths += 1
+            self.path_cells += len(event.path)
+        else:
+            self.no_path += 1
+
+    def actions_taken(self, event):
+        for action in event.actions:
+            self.actions[action.name] = self.actions.get(action.name, 0) + 1
+
+    def hazard(self, event):
+        self.hazards[event.kind] = self.hazards.get(event.kind, 0) + 1
+
+    def summary(self):
+        return {
+            "steps": self.steps,
+            "actions": dict(self.actions),
+            "hazards": dict(self.hazards),
+            "paths": self.paths,
+            "mean_path_length": self.path_cells / self.paths if self.paths else 0.0,
+            "no_path": self.no_path,
+            "kb_updates": self.kb_updates,
+        }
@@ -2,12 +2,66 @@ from z3 import *
 import heapq
 from typing import List, Tuple
 from const import Percept, Object, Action, Direction
+from propagation_kb import PropagationKnowledgeBase
 
 class KnowledgeBase:
-    def __init__(self, size: int):
+    # grounded=True encodes the rules as one Boolean per (predicate, cell)
+    # instead of quantified functions over Int, so every check is plain SAT.
+    def __init__(self, size: int, grounded: bool = False):
         self.size = size
+        self.grounded = grounded
+        # One live solver for the whole run; queries are answered inside
+        # push/pop scopes instead of cloning the assertion set each time.
         self.solver = Solver()
 
+        # Query cache. Facts are only ever added, so an impossible object
+        # stays impossible for good; other answers hold until the version
+        # counter moves on.
+        self.version = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._proven_absent = set()   # (name, x, y)
+        self._known_present = set()   # (name, x, y) asserted with add_object
+        self._cache = {}              # (name, x, y) -> check result
+        self._cache_version = 0
+
+        # The same facts as plain clauses, for hazard_probabilities. A
+        # contradiction makes the solver unsat, which would prove every
+        # object absent everywhere. The clause copy keeps it to the object
+        # concerned, and drops the "somewhere on the board" rule of an object
+        # the map turns out not to have, which the solver cannot. From the
+        # first time the two part ways, queries are answered from the clauses.
+        self._facts = PropagationKnowledgeBase(size)
+        self._somewhere = set(Object)   # objects the solver's rules place somewhere
+        self._contradicted = False
+
+        # Wumpus facts, kept to move them onto fresh predicates when a
+        # wumpus is killed (remove_wumpus): stench seen or not per observed
+        # cell, cells without / with a wumpus, and the number of kills
+        self._stench_seen = {}
+        self._no_wumpus = set()
+        self._wumpus_at = set()
+        self._kills = 0
+
+        if grounded:
+            self.pit = self._grid("Pit")
+            self.wumpus = self._grid("Wumpus")
+            self.gas = self._grid("Gas")
+            self.gold = self._grid("Gold")
+            self.potion = self._grid("Potion")
+
+            self.stench = self._grid("Stench")
+            self.breeze = self._grid("Breeze")
+            self.whiff = self._grid("Whiff")
+            self.glow = self._grid("Glow")
+
+            self.inbounds = lambda x, y: BoolVal(0 <= x < size and 0 <= y < size)
+            self._add_grounded_rules()
+            return
+
+        # Quantifier instantiation can run away, so cap every check
+        self.solver.set("timeout", 100)
+
         self.x = Int('x')
         self.y = Int('y')
 
@@ -25,110 +79,247 @@ class KnowledgeBase:
         self.inbounds = Function("Inbounds", IntSort(), IntSort(), BoolSort())
         self._add_rules()
 
+    # Grounded predicate: one Bool per cell, False outside the board
+    def _grid(self, name: str):
+        cells = [[Bool(f"{name}_{i}_{j}") for j in range(self.size)] for i in range(self.size)]
+
+        def pred(x: int, y: int):
+            if 0 <= x < self.size and 0 <= y < self.size:
+                return cells[x][y]
+            return BoolVal(False)
+
+        return pred
+
+    def _neighbors(self, x: int, y: int):
+        cells = []
+        for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.size and 0 <= ny < self.size:
+                cells.append((nx, ny))
+        return cells
+
+    def _add_grounded_rules(self):
+        for hazard, percept in [(self.pit, self.breeze), (self.wumpus, self.stench),
+                                (self.gas, self.whiff), (self.potion, self.glow)]:
+            self._add_grounded_percept_rules(hazard, percept)
+
+        cells = [(x, y) for x in range(self.size) for y in range(self.size)]
+        for pred in [self.pit, self.wumpus, self.gas, self.gold, self.potion]:
+            self.solver.add(Or([pred(x, y) for x, y in cells]))
+
+    # percept(c) <=> some neighbour of c holds the hazard. This covers all
+    # three quantified rules of _add_percept_rules for every in-bounds cell.
+    def _add_grounded_percept_rules(self, hazard, percept):
+        for x in range(self.size):
+            for y in range(self.size):
+                adjacent = [hazard(nx, ny) for nx, ny in self._neighbors(x, y)]
+                self.solver.add(percept(x, y) == Or(adjacent) if adjacent else Not(percept(x, y)))
+
     def _add_rules(self):
         x, y = self.x, self.y
+        last = self.size - 1
 
         self.solver.add(ForAll([x, y], And(
-            Implies(And(x >= 0, x <= 9, y >= 0, y <= 9), self.inbounds(x, y)),
-            Implies(Or(x < 0, x > 9, y < 0, y > 9), Not(self.inbounds(x, y)))
+            Implies(And(x >= 0, x <= last, y >= 0, y <= last), self.inbounds(x, y)),
+            Implies(Or(x < 0, x > last, y < 0, y > last), Not(self.inbounds(x, y)))
         )))
 
-        def add_percept_rules(hazard, percept):
-            self.solver.add(ForAll([x, y],
-                Implies(hazard(x, y), And(
-                    Implies(self.inbounds(x + 1, y), percept(x + 1, y)),
-                    Implies(self.inbounds(x - 1, y), percept(x - 1, y)),
-                    Implies(self.inbounds(x, y + 1), percept(x, y + 1)),
-                    Implies(self.inbounds(x, y - 1), percept(x, y - 1))
-                ))))
-            self.solver.add(ForAll([x, y],
-                Implies(percept(x, y), Or(
-                    And(self.inbounds(x + 1, y), hazard(x + 1, y)),
-                    And(self.inbounds(x - 1, y), hazard(x - 1, y)),
-                    And(self.inbounds(x, y + 1), hazard(x, y + 1)),
-                    And(self.inbounds(x, y - 1), hazard(x, y - 1))
-                ))))
-            self.solver.add(ForAll([x, y],
-                Implies(Not(percept(x, y)), And(
-                    Implies(self.inbounds(x + 1, y), Not(hazard(x + 1, y))),
-                    Implies(self.inbounds(x - 1, y), Not(hazard(x - 1, y))),
-                    Implies(self.inbounds(x, y + 1), Not(hazard(x, y + 1))),
-                    Implies(self.inbounds(x, y - 1), Not(hazard(x, y - 1)))
-                ))))
-
-        add_percept_rules(self.pit, self.breeze)
-        add_percept_rules(self.wumpus, self.stench)
-        add_percept_rules(self.gas, self.whiff)
-        add_percept_rules(self.potion, self.glow)
+        self._add_percept_rules(self.pit, self.breeze)
+        self._add_percept_rules(self.wumpus, self.stench)
+        self._add_percept_rules(self.gas, self.whiff)
+        self._add_percept_rules(self.potion, self.glow)
 
         for pred in [self.pit, self.wumpus, self.gas, self.gold, self.potion]:
             self.solver.add(Exists([x, y], And(self.inbounds(x, y), pred(x, y))))
 
+    def _add_percept_rules(self, hazard, percept):
+        x, y = self.x, self.y
+        self.solver.add(ForAll([x, y],
+            Implies(hazard(x, y), And(
+                Implies(self.inbounds(x + 1, y), percept(x + 1, y)),
+                Implies(self.inbounds(x - 1, y), percept(x - 1, y)),
+                Implies(self.inbounds(x, y + 1), percept(x, y + 1)),
+                Implies(self.inbounds(x, y - 1), percept(x, y - 1))
+            ))))
+        self.solver.add(ForAll([x, y],
+            Implies(percept(x, y), Or(
+                And(self.inbounds(x + 1, y), hazard(x + 1, y)),
+                And(self.inbounds(x - 1, y), hazard(x - 1, y)),
+                And(self.inbounds(x, y + 1), hazard(x, y + 1)),
+                And(self.inbounds(x, y - 1), hazard(x, y - 1))
+            ))))
+        self.solver.add(ForAll([x, y],
+            Implies(Not(percept(x, y)), And(
+                Implies(self.inbounds(x + 1, y), Not(hazard(x + 1, y))),
+                Implies(self.inbounds(x - 1, y), Not(hazard(x - 1, y))),
+                Implies(self.inbounds(x, y + 1), Not(hazard(x, y + 1))),
+                Implies(self.inbounds(x, y - 1), Not(hazard(x, y - 1)))
+            ))))
 
-    # Add initial state
+    # Add initial state: the start cell is empty, and its percepts arrive
+    # through add_percepts like any other cell's
     def add_initial_state(self, x: int, y: int):
+        self.version += 1
+        self._facts.add_initial_state(x, y)
         self.solver.add(self.inbounds(x, y))
         self.solver.add(Not(self.pit(x, y)))
         self.solver.add(Not(self.wumpus(x, y)))
         self.solver.add(Not(self.gas(x, y)))
         self.solver.add(Not(self.gold(x, y)))
         self.solver.add(Not(self.potion(x, y)))
-        self.solver.add(Not(self.stench(x, y)))
-        self.solver.add(Not(self.breeze(x, y)))
-        self.solver.add(Not(self.whiff(x, y)))
-        self.solver.add(Not(self.glow(x, y)))
+        self._no_wumpus.add((x, y))
 
 
     # Assumptions and Checks
     def assume_safe(self, x: int, y: int):
+        self.version += 1
+        self._facts.assume_safe(x, y)
         for h in [self.pit, self.wumpus, self.gas]:
             self.solver.add(Not(h(x, y)))
+        self._no_wumpus.add((x, y))
 
     def is_safe(self, x: int, y: int):
         return self.is_not_pit(x, y) and \
                self.is_not_wumpus(x, y) and \
                 self.is_not_gas(x, y)
     
+    # Check `expr` against the live solver inside a temporary scope,
+    # so the assertion set is never copied.
+    def _check(self, expr):
+        self.solver.push()
+        try:
+            self.solver.add(expr)
+            return self.solver.check()
+        finally:
+            self.solver.pop()
+
+    def _unsound(self):
+        return self._contradicted or self._facts.inconsistent or self._somewhere != self._facts._somewhere
+
+    # Cached check of "obj may be at (x, y)", keyed by the object's name
+    def _query(self, name: str, pred, x: int, y: int):
+        if self._unsound():
+            return sat if self._facts._possible(Object(name), x, y) else unsat
+        key = (name, x, y)
+        result = self._lookup(key)
+        if result is None:
+            result = self._check(pred(x, y))
+            self._remember(key, result)
+        return result
+
+    # Cached result for `key`, or None (counted as a miss)
+    def _lookup(self, key):
+        if self._cache_version != self.version:
+            self._cache.clear()
+            self._cache_version = self.version
+
+        if key in self._proven_absent:
+            result = unsat
+        elif key in self._known_present:
+            result = sat
+        else:
+            result = self._cache.get(key)
+
+        if result is None:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return result
+
+    def _remember(self, key, result):
+        if result == unsat:
+            self._proven_absent.add(key)
+        else:
+            self._cache[key] = result
+
     def is_not_pit(self, x: int, y: int):
-        temp = Solver()
-        temp.add(self.solver.assertions())
-        temp.set("timeout", 100)
-        temp.add(self.pit(x, y))
-        return temp.check() == unsat  
-    
+        return self._query("Pit", self.pit, x, y) == unsat
+
     def is_not_wumpus(self, x: int, y: int):
-        temp = Solver()
-        temp.add(self.solver.assertions())
-        temp.set("timeout", 100)
-        temp.add(self.wumpus(x, y))
-        return temp.check() == unsat 
-    
+        return self._query("Wumpus", self.wumpus, x, y) == unsat
+
     def is_not_gas(self, x: int, y: int):
-        temp = Solver()
-        temp.add(self.solver.assertions())
-        temp.set("timeout", 100)
-        temp.add(self.gas(x, y))
-        return temp.check() == unsat 
+        return self._query("Gas", self.gas, x, y) == unsat
 
     # def is_not_gold(self, x: int, y: int):
-    #     temp = Solver()
-    #     temp.add(self.solver.assertions())
-    #     temp.set("timeout", 100)
-    #     temp.add(self.gold(x, y))
-    #     return temp.check() == unsat
-    
+    #     return self._query("Gold", self.gold, x, y) == unsat
+
     def is_not_potion(self, x: int, y: int):
-        temp = Solver()
-        temp.add(self.solver.assertions())
-        temp.set("timeout", 100)
-        temp.add(self.potion(x, y))
-        return temp.check() == unsat
+        return self._query("Potion", self.potion, x, y) == unsat
     
+    # Classify a batch of cells in one pass. Returns, per cell, whether each
+    # object is still possible there plus the overall "safe" verdict.
+    def classify(self, cells):
+        if self._unsound():
+            return self._facts.classify(cells)
+        cells = list(cells)
+        result = {cell: {} for cell in cells}
+        for name, pred in [("Pit", self.pit), ("Wumpus", self.wumpus),
+                           ("Gas", self.gas), ("Potion", self.potion)]:
+            answers = {}
+            open_cells = []
+            for x, y in cells:
+                answers[(x, y)] = self._lookup((name, x, y))
+                if answers[(x, y)] is None:
+                    open_cells.append((x, y))
+
+            if open_cells:
+                for (x, y), answer in self._check_cells(pred, open_cells).items():
+                    self._remember((name, x, y), answer)
+                    answers[(x, y)] = answer
+
+            for cell in cells:
+                result[cell][name.lower()] = answers[cell] != unsat
+
+        for flags in result.values():
+            flags["safe"] = not (flags["pit"] or flags["wumpus"] or flags["gas"])
+        return result
+
+    # Chance of each object at each cell; see probability.py. Counted on the
+    # clause copy of the facts, so no solver call is made.
+    def hazard_probabilities(self, cells, priors=None):
+        return self._facts.hazard_probabilities(cells, priors)
+
+    # Check `pred` on every cell of `cells`. Each solver call asks for the
+    # predicate in any undecided cell; every cell the model places it in is
+    # settled at once, and an unsat answer settles the rest.
+    def _check_cells(self, pred, cells):
+        answers = {}
+        undecided = list(cells)
+        while undecided:
+            self.solver.push()
+            try:
+                self.solver.add(Or([pred(x, y) for x, y in undecided]))
+                result = self.solver.check()
+                model = self.solver.model() if result == sat else None
+            finally:
+                self.solver.pop()
+
+            if result != sat:
+                for cell in undecided:
+                    # A timeout falls back to one check per cell
+                    answers[cell] = unsat if result == unsat else self._check(pred(*cell))
+                break
+
+            remaining = []
+            for cell in undecided:
+                if is_true(model.eval(pred(*cell), model_completion=True)):
+                    answers[cell] = sat
+                else:
+                    remaining.append(cell)
+            undecided = remaining
+
+        return answers
+
     def add_object(self, obj: Object, x: int, y: int):
+        self.version += 1
+        self._facts.add_object(obj, x, y)
+        self._known_present.add((obj.value, x, y))
         if obj == Object.PIT:
             self.solver.add(self.pit(x, y))
         elif obj == Object.WUMPUS:
             self.solver.add(self.wumpus(x, y))
+            self._wumpus_at.add((x, y))
         elif obj == Object.GAS:
             self.solver.add(self.gas(x, y))
         elif obj == Object.GOLD:
@@ -137,25 +328,26 @@ class KnowledgeBase:
             self.solver.add(self.potion(x, y))
         
     def is_sure_object(self, obj: Object, x: int, y: int):
-        temp = Solver()
-        temp.add(self.solver.assertions())
-        temp.set("timeout", 100)
-
         if obj == Object.PIT:
-            temp.add(self.pit(x, y))
+            pred = self.pit
         elif obj == Object.WUMPUS:
-            temp.add(self.wumpus(x, y))
+            pred = self.wumpus
         elif obj == Object.GAS:
-            temp.add(self.gas(x, y))
+            pred = self.gas
         elif obj == Object.GOLD:
-            temp.add(self.gold(x, y))
+            pred = self.gold
         elif obj == Object.POTION:
-            temp.add(self.potion(x, y))
+            pred = self.potion
+        else:
+            return self._check(BoolVal(True)) == sat
 
-        return temp.check() == sat
+        return self._query(obj.value, pred, x, y) == sat
 
     def add_percepts(self, x: int, y: int, percepts):
+        self.version += 1
+        self._facts.add_percepts(x, y, percepts)
         self.solver.add(self.inbounds(x, y))
+        self._stench_seen[(x, y)] = Percept.STENCH in percepts
 
         if Percept.STENCH in percepts:
             self.solver.add(self.stench(x, y))
@@ -190,10 +382,13 @@ class KnowledgeBase:
 
     # Add not object
     def add_not_object(self, obj: Object, x: int, y: int):
+        self.version += 1
+        self._facts.add_not_object(obj, x, y)
         if obj == Object.PIT:
             self.solver.add(Not(self.pit(x, y)))
         elif obj == Object.WUMPUS:
             self.solver.add(Not(self.wumpus(x, y)))
+            self._no_wumpus.add((x, y))
         elif obj == Object.GAS:
             self.solver.add(Not(self.gas(x, y)))
         elif obj == Object.GOLD:
@@ -202,11 +397,51 @@ class KnowledgeBase:
             self.solver.add(Not(self.potion(x, y)))
 
 
+    # The wumpus at (x, y) was killed and its stench is gone. Facts cannot be
+    # taken back from the solver, so wumpus and stench move to fresh
+    # predicates with their rules, and what still holds is asserted again:
+    # cells seen without stench, stench away from the kill (stench next to
+    # it may have come from it alone), and the wumpus-free cells, the
+    # killed one included. The old predicates are no longer queried.
+    def remove_wumpus(self, x: int, y: int):
+        self.version += 1
+        # The old predicates stay in the solver, contradictions and all
+        self._contradicted |= self._unsound()
+        self._somewhere.discard(Object.WUMPUS)
+        self._facts.remove_wumpus(x, y)
+        self._kills += 1
+        self._wumpus_at.discard((x, y))
+        self._known_present.discard((Object.WUMPUS.value, x, y))
+        self._no_wumpus.add((x, y))
+        for cell in self._neighbors(x, y):
+            if self._stench_seen.get(cell):
+                del self._stench_seen[cell]
+
+        # No "some cell holds a wumpus" rule: the dead one may have been the only one
+        if self.grounded:
+            self.wumpus = self._grid(f"Wumpus{self._kills}")
+            self.stench = self._grid(f"Stench{self._kills}")
+            self._add_grounded_percept_rules(self.wumpus, self.stench)
+        else:
+            self.wumpus = Function(f"Wumpus{self._kills}", IntSort(), IntSort(), BoolSort())
+            self.stench = Function(f"Stench{self._kills}", IntSort(), IntSort(), BoolSort())
+            self._add_percept_rules(self.wumpus, self.stench)
+
+        for cell in self._no_wumpus:
+            self.solver.add(Not(self.wumpus(*cell)))
+        for cell in self._wumpus_at:
+            self.solver.add(self.wumpus(*cell))
+        for (cx, cy), stench in self._stench_seen.items():
+            if stench:
+                self.solver.add(self.stench(cx, cy))
+            else:
+                self.solver.add(Not(self.stench(cx, cy)))
+                for cell in self._neighbors(cx, cy):
+                    self.solver.add(Not(self.wumpus(*cell)))
+
+
     # Debugging methods
     def debug_cell(self, x: int, y: int):
         print(f"--- Cell ({x},{y}) ---")
         for h, name in [(self.pit, "Pit"), (self.wumpus, "Wumpus"), (self.gas, "Gas")]:
-            s = Solver()
-            s.add(self.solver.assertions())
-            s.add(h(x, y))
-            print(f"Possibly {name}? {s.check()}")
+            print(f"Possibly {name}? {self._check(h(x, y))}")
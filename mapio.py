@@ -0,0 +1,205 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+
+from const import board_from_planes
+
+# Text map: the board size on the first line, then one line per row with
+# `.`-separated cells. A cell is "-" or a run of tokens, e.g. "AP_G" is the
+# agent on gas and "PH_P" a pit with a potion. Characters outside the
+# tokens are skipped, so "-G" (testcase2) is gold, as it was for the old
+# loaders, and a stray lowercase "g" is nothing. Short rows end in empty
+# cells, as in some of the hand-written maps.
+TOKENS = {
+    "pit": "P",
+    "wumpus": "W",
+    "gold": "G",
+    "gas": "P_G",
+    "potion": "H_P",
+}
+AGENT_TOKEN = "A"
+
+# Longest tokens first, so "P_G" is never read as a pit followed by "_G"
+_TOKEN = re.compile(r"P_G|H_P|[AWPG]")
+_OBJECT_OF = {token: obj for obj, token in TOKENS.items()}
+
+# Bundle: many text maps in one file
+#
+#   header   "WMAPS" magic line
+#   maps     the text maps, back to back
+#   index    u64 byte offset of every map, then the map names, newline-separated
+#   trailer  offset of the index, offset of the names, map count, "WEND"
+#
+# A map inside a bundle is addressed as "<bundle path>#<index>".
+BUNDLE_MAGIC = b"WMAPS\n"
+BUNDLE_EXTENSION = ".wmaps"
+END_MAGIC = b"WEND"
+TRAILER = struct.Struct("<QQI4s")
+
+
+# Size, object planes and agent position of one map, reading only as many
+# lines of `lines` as the map has
+def parse_lines(lines):
+    lines = (line.strip() for line in lines)
+    lines = (line for line in lines if line)
+    try:
+        size = int(next(lines))
+    except StopIteration:
+        raise ValueError("Empty map") from None
+
+    planes = {obj: bytearray(size * size) for obj in TOKENS}
+    agent_pos = (size - 1, 0)
+    for i in range(size):
+        line = next(lines, None)
+        if line is None:
+            raise ValueError(f"Expected {size} rows, found {i}")
+        cells = line.split(".")
+        if len(cells) > size:
+            raise ValueError(f"Row {i} has {len(cells)} cells, expected {size}")
+        for j, cell in enumerate(cells):
+            if cell == "-" or not cell:
+                continue
+            for token in _TOKEN.findall(cell):
+                if token == AGENT_TOKEN:
+                    agent_pos = (i, j)
+                else:
+                    planes[_OBJECT_OF[token]][i * size + j] = 1
+    return size, planes, agent_pos
+
+
+# Size, object planes and agent position of a text map or a bundle entry
+def parse_map(path: str):
+    if "#" in path:
+        bundle_path, index = path.rsplit("#", 1)
+        return open_bundle(bundle_path).parse(int(index))
+    with open(path) as f:
+        return parse_lines(f)
+
+
+# Board of per-cell dicts (percepts included) and the agent start
+def load_map(path: str):
+    size, planes, agent_pos = parse_map(path)
+    return board_from_planes(size, planes), agent_pos
+
+
+def map_size(path: str):
+    if "#" in path:
+        bundle_path, index = path.rsplit("#", 1)
+        return int(open_bundle(bundle_path).text(int(index)).split(None, 1)[0])
+    with open(path) as f:
+        return int(f.readline().strip())
+
+
+# Short name of a map, for log file names and reports
+def map_name(path: str):
+    if "#" in path:
+        bundle_path, index = path.rsplit("#", 1)
+        return open_bundle(bundle_path).name(int(index))
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+### --- BUNDLES --- ###
+# Write (name, text) pairs into one bundle file; returns the number of maps
+def write_bundle(path: str, maps):
+    offsets = []
+    names = []
+    with open(path, "wb") as f:
+        f.write(BUNDLE_MAGIC)
+        for name, text in maps:
+            if "\n" in name:
+                raise ValueError(f"Map names cannot hold newlines: {name!r}")
+            offsets.append(f.tell())
+            names.append(name)
+            f.write(text.encode("utf-8"))
+            if not text.endswith("\n"):
+                f.write(b"\n")
+        index_offset = f.tell()
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        names_offset = f.tell()
+        f.write("\n".join(names).encode("utf-8"))
+        f.write(TRAILER.pack(index_offset, names_offset, len(offsets), END_MAGIC))
+    return len(offsets)
+
+
+# Memory-mapped bundle: opening reads only the trailer and the index, and
+# each map is parsed when it is asked for
+class MapBundle:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+            raise ValueError("Not a map bundle")
+
+        index_offset, names_offset, count, end = TRAILER.unpack_from(self._mm, len(self._mm) - TRAILER.size)
+        if end != END_MAGIC:
+            raise ValueError("Truncated map bundle")
+        self._offsets = list(struct.unpack_from(f"<{count}Q", self._mm, index_offset)) + [index_offset]
+        self._names_offset = names_offset
+        self._names = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def text(self, index: int):
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._mm[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+
+    def parse(self, index: int):
+        return parse_lines(self.text(index).splitlines())
+
+    def load(self, index: int):
+        size, planes, agent_pos = self.parse(index)
+        return board_from_planes(size, planes), agent_pos
+
+    def name(self, index: int):
+        if self._names is None:
+            names = self._mm[self._names_offset:len(self._mm) - TRAILER.size].decode("utf-8")
+            self._names = names.split("\n") if len(self) else []
+        return self._names[index]
+
+    # Addresses of every map, as taken by parse_map / load_map
+    def paths(self):
+        return [f"{self.path}#{index}" for index in range(len(self))]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+# Bundles stay open for the life of the process, so loading every map of a
+# bundle opens the file once
+_bundles = {}
+
+
+def open_bundle(path: str):
+    bundle = _bundles.get(path)
+    if bundle is None:
+        bundle = _bundles[path] = MapBundle(path)
+    return bundle
+
+
+def is_bundle(path: str):
+    with open(path, "rb") as f:
+        return f.read(len(BUNDLE_MAGIC)) == BUNDLE_MAGIC
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack text maps into a map bundle")
+    parser.add_argument("output", help=f"bundle file ({BUNDLE_EXTENSION})")
+    parser.add_argument("maps", nargs="+", help="text maps to pack")
+    args = parser.parse_args(argv)
+
+    def read(path):
+        with open(path) as f:
+            return f.read()
+
+    count = write_bundle(args.output, ((map_name(path), read(path)) for path in args.maps))
+    print(f"Packed {count} maps into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
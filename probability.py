@@ -0,0 +1,137 @@
+from const import Object
+
+# Prior chance that a cell holds each object, before any percept. Roughly the
+# split worldgen.hazard_counts makes of a 10% hazard density.
+PRIORS = {
+    Object.PIT: 0.05,
+    Object.WUMPUS: 0.025,
+    Object.GAS: 0.025,
+    Object.POTION: 0.01,
+}
+
+# Clauses longer than this are not percept clauses (those have at most four
+# cells) but the "the object is somewhere on the board" rule, which joins
+# every cell into one component and is all but certain under any prior
+CLAUSE_LIMIT = 4
+
+
+# Weighted model counting over positive clauses ("at least one of these
+# cells holds the object"), every cell holding the object independently with
+# the prior. Cells in no clause marginalise to 1 and never show up.
+#
+# The clause set is split into independent components (no shared cells)
+# whose counts multiply, and every count is memoised by its clause set.
+# Components away from the agent do not change between steps, so most
+# lookups on the next step are hits.
+class ModelCounter:
+    def __init__(self, prior: float, max_entries: int = 200000):
+        self.prior = prior
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counts = {}
+
+    def count(self, clauses: frozenset):
+        if not clauses:
+            return 1.0
+        result = self._counts.get(clauses)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+
+        components = split_components(clauses)
+        if len(components) > 1:
+            result = 1.0
+            for component in components:
+                result *= self.count(component)
+        else:
+            cell = _most_shared(clauses)
+            result = self.prior * self.count(_with_hazard(clauses, cell))
+            without = _without_hazard(clauses, cell)
+            if without is not None:
+                result += (1 - self.prior) * self.count(without)
+
+        if len(self._counts) >= self.max_entries:
+            self._counts.clear()
+        self._counts[clauses] = result
+        return result
+
+    # Probability that each cell of the clauses holds the object
+    def marginals(self, clauses: frozenset):
+        result = {}
+        for component in split_components(clauses):
+            total = self.count(component)
+            for cell in set().union(*component):
+                result[cell] = self.prior * self.count(_with_hazard(component, cell)) / total
+        return result
+
+
+def _with_hazard(clauses, cell):
+    return frozenset(clause for clause in clauses if cell not in clause)
+
+
+# None when some clause loses its last cell
+def _without_hazard(clauses, cell):
+    result = set()
+    for clause in clauses:
+        if cell in clause:
+            clause = clause - {cell}
+            if not clause:
+                return None
+        result.add(clause)
+    return frozenset(result)
+
+
+def _most_shared(clauses):
+    seen = {}
+    for clause in clauses:
+        for cell in clause:
+            seen[cell] = seen.get(cell, 0) + 1
+    return max(seen, key=seen.get)
+
+
+# Clauses grouped into components that share no cell (union-find on cells)
+def split_components(clauses):
+    parent = {}
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for clause in clauses:
+        cells = iter(clause)
+        first = next(cells)
+        parent.setdefault(first, first)
+        root = find(first)
+        for cell in cells:
+            parent.setdefault(cell, cell)
+            other = find(cell)
+            if other != root:
+                parent[other] = root
+
+    groups = {}
+    for clause in clauses:
+        groups.setdefault(find(next(iter(clause))), []).append(clause)
+    return [frozenset(group) for group in groups.values()]
+
+
+# Probability of `obj` at each of `cells` (cell indices) given what a
+# propagation-style store knows: state[i] is UNKNOWN / SAFE / HAZARD and
+# `clauses` the still-open positive clauses (None once satisfied).
+def object_probabilities(counter: ModelCounter, state, clauses, cells, safe: int, hazard: int):
+    live = frozenset(frozenset(clause) for clause in clauses
+                     if clause is not None and len(clause) <= CLAUSE_LIMIT)
+    fringe = counter.marginals(live)
+
+    result = {}
+    for cell in cells:
+        if state[cell] == safe:
+            result[cell] = 0.0
+        elif state[cell] == hazard:
+            result[cell] = 1.0
+        else:
+            result[cell] = fringe.get(cell, counter.prior)
+    return result
@@ -0,0 +1,114 @@
+import time
+
+# Agent phases timed by the profiler: method name -> phase name
+AGENT_PHASES = {
+    "perceive": "perceive",
+    "_find_best_cell": "find_best_cell",
+    "_rank_cells": "rank_cells",
+    "_find_path_to_best_cell": "find_path",
+    "_shoot_wumpus": "shoot_wumpus",
+    "_write_log": "log_write",
+}
+
+# Knowledge base calls timed by the profiler; each backend has a subset.
+# _check is one Z3 solver check, _check_cells a batch of them for classify.
+# They are separate phases: _check_cells falls back to _check on a
+# timeout, and one phase would count those checks twice.
+KB_PHASES = {
+    "add_percepts": "kb_update",
+    "classify": "kb_classify",
+    "hazard_probabilities": "kb_probability",
+    "_check": "solver_check",
+    "_check_cells": "solver_batch",
+}
+
+
+# Opt-in per-phase profiler for Agent.run.
+#
+#   profiler = Profiler().attach(agent)
+#   agent.run()
+#   print(profiler.summary())
+#
+# attach() swaps the timed methods for wrappers on that agent/KB instance
+# only, so an agent without a profiler runs exactly the original code. When
+# agent.kb is a proxy (benchmark's TimedKB), pass the KB it wraps as `kb`:
+# the solver checks are called by the KB on itself, never through the proxy.
+# Phase times are inclusive: find_best_cell contains rank_cells, which
+# contains kb_classify and its solver checks.
+class Profiler:
+    def __init__(self):
+        self.totals = {}     # phase -> [calls, seconds]
+        self.steps = []      # per step: phase -> [calls, seconds]
+        self._current = {}
+        self.declared = set()   # phases with a wrapped method
+
+    def attach(self, agent, kb=None):
+        kb = agent.kb if kb is None else kb
+        for method, phase in AGENT_PHASES.items():
+            self._wrap(agent, method, phase)
+        for method, phase in KB_PHASES.items():
+            if hasattr(kb, method):
+                self._wrap(kb, method, phase)
+
+        # Agent._mark_step runs at every step boundary
+        mark_step = agent._mark_step
+
+        def step_boundary():
+            step_open = agent._step_started is not None
+            mark_step()
+            if step_open:
+                self.steps.append(self._current)
+            self._current = {}
+
+        agent._mark_step = step_boundary
+        return self
+
+    def _wrap(self, owner, method, phase):
+        original = getattr(owner, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._record(phase, time.perf_counter() - start)
+
+        setattr(owner, method, timed)
+        self.declared.add(phase)
+
+    def _record(self, phase: str, seconds: float):
+        for table in (self.totals, self._current):
+            entry = table.get(phase)
+            if entry is None:
+                table[phase] = [1, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+
+    # Declared phases that were never timed
+    def missing(self):
+        return sorted(self.declared - self.totals.keys())
+
+    def report(self):
+        return {
+            "phases": {phase: {"calls": calls, "time": seconds}
+                       for phase, (calls, seconds) in self.totals.items()},
+            "steps": [{phase: {"calls": calls, "time": seconds}
+                       for phase, (calls, seconds) in step.items()}
+                      for step in self.steps],
+        }
+
+    def summary(self):
+        lines = [f"{'phase':<16}{'calls':>10}{'total s':>12}{'per call ms':>14}"]
+        for phase, (calls, seconds) in sorted(self.totals.items(), key=lambda kv: -kv[1][1]):
+            lines.append(f"{phase:<16}{calls:>10}{seconds:>12.4f}{seconds / calls * 1000:>14.4f}")
+        lines.append(f"{len(self.steps)} steps")
+        return "\n".join(lines)
+
+    # One line per step with the time spent in each phase
+    def step_breakdown(self):
+        lines = []
+        for n, step in enumerate(self.steps, 1):
+            parts = [f"{phase}={seconds * 1000:.2f}ms" for phase, (_, seconds) in sorted(step.items())]
+            lines.append(f"step {n}: " + " ".join(parts))
+        return "\n".join(lines)
@@ -0,0 +1,272 @@
+from collections import defaultdict
+from const import Percept, Object
+from probability import PRIORS, ModelCounter, object_probabilities
+
+# Objects that announce themselves through a percept on adjacent cells
+PERCEPT_OF = {
+    Object.PIT: Percept.BREEZE,
+    Object.WUMPUS: Percept.STENCH,
+    Object.GAS: Percept.WHIFF,
+    Object.POTION: Percept.GLOW,
+}
+
+# Per-cell tri-state
+UNKNOWN = 0
+SAFE = 1    # known not to hold the object
+HAZARD = 2  # known to hold the object
+
+class PropagationKnowledgeBase:
+    # Z3-free drop-in for KnowledgeBase.
+    # Every fact is either a unit ("no pit at c") or a positive clause ("some
+    # neighbour of c holds a pit"), and objects are independent. So an object
+    # is possible at a cell exactly when the cell is not known safe, and unit
+    # propagation alone decides every query without searching the frontier.
+
+    def __init__(self, size: int):
+        self.size = size
+        self.state = {}
+        # clauses[obj][i] holds the still-undecided cells of clause i,
+        # or None once the clause is satisfied
+        self.clauses = {}
+        self.watch = {}
+        # Objects whose facts contradict each other. Nothing said about a
+        # broken object can be trusted, so it stays possible everywhere
+        # except the cells known empty; the other objects are unaffected.
+        self._broken = set()
+        # Memoised model counters for hazard_probabilities, one per object
+        self._counters = {}
+
+        # What the KB was told, per object, so the facts about an object
+        # can be rebuilt (_replay): percept seen or not per observed cell,
+        # cells said to be empty, cells said to hold it
+        self._seen = {obj: {} for obj in Object}
+        self._empty = {obj: set() for obj in Object}
+        self._present = {obj: set() for obj in Object}
+        # Objects still assumed to be somewhere on the board. The assumption
+        # goes when it contradicts what was seen (a map without the object)
+        # or when a kill removes a wumpus that may have been the only one.
+        self._somewhere = set(Object)
+
+        for obj in Object:
+            self._reset(obj)
+
+    @property
+    def inconsistent(self):
+        return bool(self._broken)
+
+    def _reset(self, obj: Object):
+        self.state[obj] = [UNKNOWN] * (self.size * self.size)
+        self.clauses[obj] = []
+        self.watch[obj] = defaultdict(list)
+        self._broken.discard(obj)
+        if obj in self._somewhere:
+            self._add_clause(obj, range(self.size * self.size))
+
+    # Rebuild the facts about `obj` from what the KB was told
+    def _replay(self, obj: Object):
+        self._reset(obj)
+        for cell in self._empty[obj]:
+            self._assign(obj, self._index(*cell), SAFE)
+        for cell in self._present[obj]:
+            self._assign(obj, self._index(*cell), HAZARD)
+        for (x, y), seen in self._seen[obj].items():
+            self._apply_seen(obj, x, y, seen)
+
+    # A contradiction may come from the "somewhere on the board" assumption
+    # alone; drop it and rebuild before calling the object broken
+    def _settle(self, obj: Object):
+        if obj in self._broken and obj in self._somewhere:
+            self._somewhere.discard(obj)
+            self._replay(obj)
+
+    def _index(self, x: int, y: int):
+        if 0 <= x < self.size and 0 <= y < self.size:
+            return x * self.size + y
+        return None
+
+    def _neighbors(self, x: int, y: int):
+        cells = []
+        for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
+            i = self._index(x + dx, y + dy)
+            if i is not None:
+                cells.append(i)
+        return cells
+
+    # Assign a value to a cell and propagate it through the clauses
+    def _assign(self, obj: Object, cell: int, value: int):
+        state = self.state[obj]
+        clauses = self.clauses[obj]
+        watch = self.watch[obj]
+        pending = [(cell, value)]
+        while pending:
+            cell, value = pending.pop()
+            if state[cell] == value:
+                continue
+            if state[cell] != UNKNOWN:
+                self._broken.add(obj)
+                continue
+            state[cell] = value
+
+            for ci in watch.pop(cell, ()):
+                clause = clauses[ci]
+                if clause is None:
+                    continue
+                if value == HAZARD:
+                    clauses[ci] = None
+                    continue
+                clause.discard(cell)
+                if not clause:
+                    self._broken.add(obj)
+                elif len(clause) == 1:
+                    pending.append((next(iter(clause)), HAZARD))
+
+    # At least one of `cells` holds `obj`
+    def _add_clause(self, obj: Object, cells):
+        state = self.state[obj]
+        live = set()
+        for cell in cells:
+            if state[cell] == HAZARD:
+                return
+            if state[cell] == UNKNOWN:
+                live.add(cell)
+
+        if not live:
+            self._broken.add(obj)
+        elif len(live) == 1:
+            self._assign(obj, live.pop(), HAZARD)
+        else:
+            ci = len(self.clauses[obj])
+            self.clauses[obj].append(live)
+            for cell in live:
+                self.watch[obj][cell].append(ci)
+
+    def _observe(self, x: int, y: int, percepts):
+        for obj, percept in PERCEPT_OF.items():
+            self._seen[obj][(x, y)] = percept in percepts
+            self._apply_seen(obj, x, y, percept in percepts)
+            self._settle(obj)
+
+    def _apply_seen(self, obj: Object, x: int, y: int, seen: bool):
+        if seen:
+            self._add_clause(obj, self._neighbors(x, y))
+        else:
+            for cell in self._neighbors(x, y):
+                self._assign(obj, cell, SAFE)
+
+    # Mark a cell empty (or holding the object) and remember it
+    def _set(self, obj: Object, x: int, y: int, value: int):
+        cell = self._index(x, y)
+        if cell is None:
+            return
+        (self._empty if value == SAFE else self._present)[obj].add((x, y))
+        self._assign(obj, cell, value)
+        self._settle(obj)
+
+    def _possible(self, obj: Object, x: int, y: int):
+        cell = self._index(x, y)
+        if cell is None:
+            return False
+        if obj in self._broken:
+            return (x, y) not in self._empty[obj]
+        return self.state[obj][cell] != SAFE
+
+
+    # Add initial state: the start cell is empty, and its percepts arrive
+    # through add_percepts like any other cell's
+    def add_initial_state(self, x: int, y: int):
+        for obj in Object:
+            self._set(obj, x, y, SAFE)
+
+
+    # Assumptions and Checks
+    def assume_safe(self, x: int, y: int):
+        for obj in [Object.PIT, Object.WUMPUS, Object.GAS]:
+            self._set(obj, x, y, SAFE)
+
+    def is_safe(self, x: int, y: int):
+        return self.is_not_pit(x, y) and \
+               self.is_not_wumpus(x, y) and \
+                self.is_not_gas(x, y)
+
+    def is_not_pit(self, x: int, y: int):
+        return not self._possible(Object.PIT, x, y)
+
+    def is_not_wumpus(self, x: int, y: int):
+        return not self._possible(Object.WUMPUS, x, y)
+
+    def is_not_gas(self, x: int, y: int):
+        return not self._possible(Object.GAS, x, y)
+
+    def is_not_potion(self, x: int, y: int):
+        return not self._possible(Object.POTION, x, y)
+
+    # Classify a batch of cells; same shape as KnowledgeBase.classify
+    def classify(self, cells):
+        result = {}
+        for x, y in cells:
+            flags = {
+                "pit": self._possible(Object.PIT, x, y),
+                "wumpus": self._possible(Object.WUMPUS, x, y),
+                "gas": self._possible(Object.GAS, x, y),
+                "potion": self._possible(Object.POTION, x, y),
+            }
+            flags["safe"] = not (flags["pit"] or flags["wumpus"] or flags["gas"])
+            result[(x, y)] = flags
+        return result
+
+    # Chance of each object at each cell given the percepts so far, with
+    # every cell holding an object independently at its prior density.
+    # Same shape as classify, with probabilities instead of flags.
+    def hazard_probabilities(self, cells, priors=None):
+        priors = priors or PRIORS
+        cells = list(cells)
+        indices = [self._index(x, y) for x, y in cells]
+        inside = [i for i in indices if i is not None]
+        result = {cell: {} for cell in cells}
+        for obj, prior in priors.items():
+            counter = self._counters.get(obj)
+            if counter is None or counter.prior != prior:
+                counter = self._counters[obj] = ModelCounter(prior)
+            if obj in self._broken:
+                probabilities = {i: prior for i in inside if divmod(i, self.size) not in self._empty[obj]}
+            else:
+                probabilities = object_probabilities(counter, self.state[obj], self.clauses[obj], inside, SAFE, HAZARD)
+            for cell, i in zip(cells, indices):
+                result[cell][obj.value.lower()] = probabilities.get(i, 0.0)
+        return result
+
+    def add_object(self, obj: Object, x: int, y: int):
+        self._set(obj, x, y, HAZARD)
+
+    def is_sure_object(self, obj: Object, x: int, y: int):
+        return self._possible(obj, x, y)
+
+    def add_percepts(self, x: int, y: int, percepts):
+        self._observe(x, y, percepts)
+
+    # Add not object
+    def add_not_object(self, obj: Object, x: int, y: int):
+        self._set(obj, x, y, SAFE)
+
+    # The wumpus at (x, y) was killed and its stench is gone. Stench seen
+    # next to it may have come from it alone, so those observations are
+    # dropped, and the wumpus facts are rebuilt from everything else:
+    # cells seen without stench, stench away from every kill, and the
+    # killed cells, which are now empty.
+    def remove_wumpus(self, x: int, y: int):
+        obj = Object.WUMPUS
+        self._somewhere.discard(obj)
+        self._present[obj].discard((x, y))
+        self._empty[obj].add((x, y))
+        seen = self._seen[obj]
+        for cell in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+            if seen.get(cell):
+                del seen[cell]
+        self._replay(obj)
+
+
+    # Debugging methods
+    def debug_cell(self, x: int, y: int):
+        print(f"--- Cell ({x},{y}) ---")
+        for obj in [Object.PIT, Object.WUMPUS, Object.GAS]:
+            print(f"Possibly {obj.value}? {self._possible(obj, x, y)}")
@@ -0,0 +1,271 @@
+import argparse
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+
+from mapio import map_size
+from steplog import open_steps
+
+CELL_SIZE = 75
+MAX_FRAME = 1200     # frames are scaled down to about this many pixels wide
+HEADER_HEIGHT = 24
+FRAME_DELAY = 500    # ms per frame
+
+# Directional arrows and entity symbols
+SYMBOLS = {
+    "UP": "↑",
+    "DOWN": "↓",
+    "LEFT": "←",
+    "RIGHT": "→",
+    "WUMPUS": "W",
+    "PIT": "P",
+    "GOLD": "★",
+    "BREEZE": "~",
+    "STENCH": "S",
+    "POTION": "P",
+    "GAS": "G",
+}
+
+# Stand-ins when no TrueType font with the arrows is available
+ASCII_SYMBOLS = {"↑": "^", "↓": "v", "←": "<", "→": ">", "★": "*"}
+
+COLORS = {
+    "visited": "#d0f0d0",
+    "current": "#a0d0ff",
+    "inpath": "#fceabb",
+    "best": "#ffcc99",
+
+    "wumpus": "#ff6666",
+    "pit": "#333333",
+    "gold": "#ffcc00",
+    "breeze": "#e6f9ff",
+    "stench": "#ffeb99",
+    "potion": "#ff99cc",
+    "gas": "#99ff99",
+    "empty": "#f0f0f0",
+}
+
+
+# Final (fill, symbol, text color, font size) of every non-empty cell in a
+# step. Later layers cover earlier ones: visited, best, path, possible
+# hazards, then the agent.
+def cell_looks(step):
+    looks = {}
+    for (x, y) in step.get("visited", []):
+        looks[(x, y)] = (COLORS["visited"], "", None, 0)
+
+    best = step.get("best", [-1, -1])
+    if best:
+        looks[tuple(best)] = (COLORS["best"], "", None, 0)
+
+    for (x, y) in step.get("path", []) or []:
+        looks[(x, y)] = (COLORS["inpath"], "", None, 0)
+
+    for cell, rank in step.get("ranked", []):
+        if rank < -900:
+            entity = "pit"
+        elif rank < -400:
+            entity = "wumpus"
+        elif rank < 200:
+            entity = "gas"
+        elif rank > 1000:
+            entity = "potion"
+        else:
+            continue
+        looks[tuple(cell)] = (COLORS[entity], SYMBOLS[entity.upper()], "white", 16)
+
+    loc = tuple(step.get("location", (-1, -1)))
+    if loc != (-1, -1):
+        looks[loc] = (COLORS["current"], SYMBOLS.get(step.get("direction", "UP"), "?"), "blue", 24)
+    return looks
+
+
+def _font(size: int):
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size), True
+    except OSError:
+        return ImageFont.load_default(), False
+
+
+# Draws steps of one run as PIL images. The empty grid is drawn once and
+# copied for every frame, so a frame costs only its non-empty cells.
+# Frames are palette ("P") images: the board has a dozen flat colors, so GIF
+# frames need no quantizing and are a third of the size to ship back from
+# the workers.
+class FrameRenderer:
+    def __init__(self, board_size: int, cell_size: int = None):
+        self.board_size = board_size
+        self.cell_size = cell_size or max(4, min(CELL_SIZE, MAX_FRAME // board_size))
+        self.width = board_size * self.cell_size
+        self.height = board_size * self.cell_size + HEADER_HEIGHT
+        self._fonts = {}
+
+        self._base = Image.new("P", (self.width, self.height), "white")
+        draw = ImageDraw.Draw(self._base)
+        for i in range(board_size + 1):
+            offset = i * self.cell_size
+            draw.line([(0, HEADER_HEIGHT + offset), (self.width, HEADER_HEIGHT + offset)], fill="black")
+            draw.line([(offset, HEADER_HEIGHT), (offset, self.height)], fill="black")
+
+    def font(self, size: int):
+        if size not in self._fonts:
+            self._fonts[size] = _font(size)
+        return self._fonts[size]
+
+    def render(self, step, index: int = None, total: int = None):
+        image = self._base.copy()
+        draw = ImageDraw.Draw(image)
+        cs = self.cell_size
+
+        # Symbols scale with the cell; below 12 px they are left out
+        scale = cs / CELL_SIZE
+        for (x, y), (fill, symbol, color, size) in cell_looks(step).items():
+            if not (0 <= x < self.board_size and 0 <= y < self.board_size):
+                continue
+            x0, y0 = y * cs, HEADER_HEIGHT + x * cs
+            draw.rectangle([x0, y0, x0 + cs, y0 + cs], fill=fill, outline="black")
+            if symbol and cs >= 12:
+                font, unicode_ok = self.font(max(8, round(size * scale)))
+                if not unicode_ok:
+                    symbol = ASCII_SYMBOLS.get(symbol, symbol)
+                _centered_text(draw, x0 + cs // 2, y0 + cs // 2, symbol, font, color)
+
+        header = f"Step {index + 1}/{total}" if index is not None and total else "Step"
+        header += (f"  HP {step.get('hp', 0)}  Score {step.get('score', 0)}"
+                   f"  Arrows {step.get('arrows', 0)}  Potions {step.get('potions', 0)}")
+        font = self.font(12)[0]
+        left, top, _, bottom = draw.textbbox((0, 0), header, font=font)
+        draw.text((4 - left, (HEADER_HEIGHT - (bottom - top)) // 2 - top), header, fill="black", font=font)
+        return image
+
+
+# Bitmap fonts do not take an anchor, so center from the text's bounding box
+def _centered_text(draw, cx: int, cy: int, text: str, font, fill):
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    draw.text((cx - (left + right) // 2, cy - (top + bottom) // 2), text, fill=fill, font=font)
+
+
+# Board size of a run: a binary trace records it, otherwise it is the first
+# size of the map
+def board_size(reader, map_path: str = None):
+    size = getattr(reader, "size", None)
+    if size:
+        return size
+    if not map_path:
+        raise ValueError("The board size is needed: pass the map file")
+    return map_size(map_path)
+
+
+### --- WORKERS --- ###
+# Each worker process opens the log itself and renders the frames it is
+# handed; only the finished frames travel back.
+_worker = {}
+
+
+def _init_worker(log_path: str, size: int, cell_size: int, mode: str):
+    _worker["reader"] = open_steps(log_path)
+    _worker["renderer"] = FrameRenderer(size, cell_size)
+    _worker["mode"] = mode
+
+
+def _render_frame(index: int):
+    reader = _worker["reader"]
+    image = _worker["renderer"].render(reader[index], index, len(reader))
+    if _worker["mode"] == "P":
+        return image
+    return image.convert("RGB").tobytes()
+
+
+def _frames(log_path: str, indices, size: int, cell_size: int, mode: str, workers: int = None):
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(indices) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(log_path, size, cell_size, mode)) as pool:
+        yield from pool.map(_render_frame, indices, chunksize=chunksize)
+
+
+def export_png(log_path: str, out_path: str, index: int = -1, map_path: str = None, cell_size: int = None):
+    reader = open_steps(log_path)
+    try:
+        renderer = FrameRenderer(board_size(reader, map_path), cell_size)
+        index = index % len(reader)
+        renderer.render(reader[index], index, len(reader)).save(out_path, "PNG")
+    finally:
+        reader.close()
+
+
+# Animated replay of a run; the format follows the extension (.gif or .mp4).
+# Frames are rendered in parallel and handed to the writer in step order.
+def export_animation(log_path: str, out_path: str, map_path: str = None, delay: int = FRAME_DELAY,
+                     cell_size: int = None, workers: int = None, steps=None):
+    reader = open_steps(log_path)
+    try:
+        size = board_size(reader, map_path)
+        indices = list(steps) if steps is not None else list(range(len(reader)))
+    finally:
+        reader.close()
+    if not indices:
+        raise ValueError("The log has no steps")
+    renderer = FrameRenderer(size, cell_size)
+
+    extension = os.path.splitext(out_path)[1].lower()
+    if extension == ".gif":
+        frames = _frames(log_path, indices, size, renderer.cell_size, "P", workers)
+        first = next(frames)
+        first.save(out_path, save_all=True, append_images=frames, duration=delay, loop=0, optimize=False)
+    elif extension == ".mp4":
+        _write_mp4(_frames(log_path, indices, size, renderer.cell_size, "RGB", workers),
+                   out_path, renderer.width, renderer.height, 1000 / delay)
+    else:
+        raise ValueError(f"Unknown animation format: {extension}")
+
+
+# Raw RGB frames piped into ffmpeg, so no frame is ever written to disk
+def _write_mp4(frames, out_path: str, width: int, height: int, fps: float):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("MP4 export needs ffmpeg on the PATH")
+    command = [
+        ffmpeg, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "-",
+        # yuv420p needs even dimensions
+        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p", out_path,
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for frame in frames:
+            process.stdin.write(frame)
+    finally:
+        process.stdin.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {process.returncode}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a step log to PNG, GIF or MP4 without a display")
+    parser.add_argument("log", help="step log (.jsonl or .wtrace)")
+    parser.add_argument("output", help="output file: .png (one step), .gif or .mp4")
+    parser.add_argument("--map", help="map file, for the board size of JSONL logs")
+    parser.add_argument("--step", type=int, default=-1, help="step to render for .png (default: last)")
+    parser.add_argument("--delay", type=int, default=FRAME_DELAY, help="ms per frame")
+    parser.add_argument("--cell-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    map_path = args.map
+    if map_path is None:
+        guess = os.path.join("input", os.path.splitext(os.path.basename(args.log))[0] + ".txt")
+        map_path = guess if os.path.exists(guess) else None
+
+    if args.output.lower().endswith(".png"):
+        export_png(args.log, args.output, args.step, map_path, args.cell_size)
+    else:
+        export_animation(args.log, args.output, map_path, args.delay, args.cell_size, args.workers)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import bisect
+import json
+import queue
+import threading
+from collections import OrderedDict
+
+from bintrace import TraceEncoder, TraceReader, is_trace
+
+# Delta step log: a header line, then one JSON object per step.
+# Keyframes ({"k": 1, ...}) hold the complete record; every other line holds
+# only the fields that changed since the previous step, with newly visited
+# cells under "visited+" instead of the whole visited list, and the ranked
+# frontier as changes to the previous one (see ranked_delta).
+FORMAT = "wumpus-delta"
+VERSION = 2
+RANKED_KEYS = ("ranked-", "ranked+", "ranks", "order")
+# Version 1 logs were written with spaces after separators
+KEYFRAME_PREFIXES = (b'{"k":1', b'{"k": 1')
+
+_MISSING = object()
+
+
+# Encoders turn step records into bytes for a sink: header() once, encode()
+# per record, footer() when the log is closed.
+class JsonlEncoder:
+    def header(self):
+        return b""
+
+    def encode(self, record):
+        return (json.dumps(record) + "\n").encode("utf-8")
+
+    def footer(self):
+        return b""
+
+
+class DeltaEncoder(JsonlEncoder):
+    def __init__(self, keyframe_every: int = 50):
+        self.keyframe_every = keyframe_every
+        self._count = 0
+        self._previous = None
+        self._visited = set()
+
+    def header(self):
+        header = {"format": FORMAT, "version": VERSION, "keyframe_every": self.keyframe_every}
+        return (json.dumps(header) + "\n").encode("utf-8")
+
+    # Written without spaces after separators, unlike the full log
+    def encode(self, record):
+        return (json.dumps(self.delta(record), separators=(",", ":")) + "\n").encode("utf-8")
+
+    def delta(self, record):
+        visited = record.get("visited", [])
+        if self._previous is None or self._count % self.keyframe_every == 0:
+            delta = {"k": 1}
+            delta.update(record)
+            self._visited = {tuple(cell) for cell in visited}
+        else:
+            delta = {"step": record["step"]}
+            for key, value in record.items():
+                if key != "step" and key != "visited" and self._previous.get(key, _MISSING) != value:
+                    if key == "ranked" and isinstance(self._previous.get(key), list) and isinstance(value, list):
+                        delta.update(ranked_delta(self._previous[key], value))
+                    else:
+                        delta[key] = value
+
+            added = [cell for cell in visited if tuple(cell) not in self._visited]
+            self._visited.update(tuple(cell) for cell in added)
+            if len(self._visited) != len(visited):
+                # Visited cells never disappear in a run, but stay correct if they do
+                delta["visited"] = visited
+                self._visited = {tuple(cell) for cell in visited}
+            elif added:
+                delta["visited+"] = added
+
+        self._previous = record
+        self._count += 1
+        return delta
+
+
+# The ranked frontier moves little between steps: a cell or two joins or
+# leaves, and the others' ranks shift by the change in travel cost. The
+# delta holds the cells that left ("ranked-"), the cells that joined with
+# their rank ("ranked+"), the rank change of every cell that stayed, in
+# its previous order ("ranks", left out when all are 0), and, when sorting
+# stayed + joined by rank does not give the agent's order back (ties), that
+# order as indices into stayed + joined ("order").
+def ranked_delta(previous, ranked):
+    current = {tuple(cell): rank for cell, rank in ranked}
+    delta = {}
+    left = [cell for cell, _ in previous if tuple(cell) not in current]
+    if left:
+        delta["ranked-"] = left
+    stayed = [(tuple(cell), rank) for cell, rank in previous if tuple(cell) in current]
+    known = {cell for cell, _ in stayed}
+    joined = [[cell, rank] for cell, rank in ranked if tuple(cell) not in known]
+    if joined:
+        delta["ranked+"] = joined
+    changes = [current[cell] - rank for cell, rank in stayed]
+    if any(changes):
+        delta["ranks"] = changes
+
+    entries = [cell for cell, _ in stayed] + [tuple(cell) for cell, _ in joined]
+    order = [tuple(cell) for cell, _ in ranked]
+    if sorted(entries, key=lambda cell: -current[cell]) != order:
+        position = {cell: i for i, cell in enumerate(entries)}
+        delta["order"] = [position[cell] for cell in order]
+    return delta
+
+
+# The ranked list rebuilt from the previous one and a delta (ranked_delta)
+def apply_ranked(previous, delta):
+    left = {tuple(cell) for cell in delta.get("ranked-", ())}
+    entries = [[cell, rank] for cell, rank in previous if tuple(cell) not in left]
+    for entry, change in zip(entries, delta.get("ranks", ())):
+        entry[1] += change
+    entries += [list(entry) for entry in delta.get("ranked+", ())]
+    if "order" in delta:
+        return [entries[i] for i in delta["order"]]
+    return sorted(entries, key=lambda entry: -entry[1])
+
+
+ENCODERS = {
+    "full": JsonlEncoder,
+    "delta": DeltaEncoder,
+    "binary": TraceEncoder,
+}
+
+# File extension of each log format
+LOG_EXTENSIONS = {
+    "full": ".jsonl",
+    "delta": ".jsonl",
+    "binary": ".wtrace",
+}
+
+
+### --- SINKS --- ###
+# A sink receives one record per step from the agent. Records are handed
+# over as-is, so the agent must not mutate a record after writing it.
+class NullSink:
+    def write(self, record):
+        pass
+
+    def close(self):
+        pass
+
+
+# Encodes and writes on the calling thread
+class FileSink:
+    def __init__(self, path: str, encoder=None):
+        self.encoder = encoder or JsonlEncoder()
+        self._file = open(path, "wb")
+        self._file.write(self.encoder.header())
+
+    def write(self, record):
+        self._file.write(self.encoder.encode(record))
+
+    def close(self):
+        self._file.write(self.encoder.footer())
+        self._file.close()
+
+
+# Queues records for a background thread that encodes and writes them in
+# batches, so the caller never waits on encoding or disk
+class ThreadedSink(FileSink):
+    _STOP = object()
+
+    def __init__(self, path: str, encoder=None, batch_size: int = 256):
+        super().__init__(path, encoder)
+        self.batch_size = batch_size
+        self._queue = queue.SimpleQueue()
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, name="step-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        self._queue.put(record)
+
+    def _drain(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is self._STOP:
+                batch.pop()
+                stopping = True
+            if self._error is None:
+                try:
+                    self._file.write(b"".join(self.encoder.encode(record) for record in batch))
+                except Exception as e:
+                    self._error = e
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+        super().close()
+        if self._error is not None:
+            raise self._error
+
+
+# Sink for a log format name ("full", "delta", "binary") or "none".
+# The binary trace packs cells against the board size.
+def make_sink(path: str, log_format: str = "full", threaded: bool = True, board_size: int = None):
+    if log_format == "none":
+        return NullSink()
+    if log_format not in ENCODERS:
+        raise ValueError(f"Unknown log format: {log_format}")
+    encoder = TraceEncoder(board_size) if log_format == "binary" else ENCODERS[log_format]()
+    sink = ThreadedSink if threaded else FileSink
+    return sink(path, encoder)
+
+
+# Rebuild a full record from the previous one and a delta line
+def apply_delta(previous, delta):
+    if delta.get("k"):
+        record = dict(delta)
+        del record["k"]
+        return record
+
+    record = dict(previous)
+    for key, value in delta.items():
+        if key == "visited+":
+            record["visited"] = previous["visited"] + value
+        elif key not in RANKED_KEYS:
+            record[key] = value
+    if any(key in delta for key in RANKED_KEYS):
+        record["ranked"] = apply_ranked(previous["ranked"], delta)
+    return record
+
+
+# Random access to the steps of a step log, full JSONL or delta.
+# Opening only records the byte offset of every line; steps are decoded when
+# asked for, replaying deltas from the nearest keyframe.
+class StepLogReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.delta = False
+        self.offsets = []
+        self.keyframes = []   # line numbers of keyframes (delta logs only)
+
+        with open(path, "rb") as f:
+            first = f.readline()
+            if first.startswith(b'{"format"'):
+                header = json.loads(first)
+                if header.get("format") != FORMAT:
+                    raise ValueError(f"Unknown step log format: {header.get('format')}")
+                self.delta = True
+            else:
+                f.seek(0)
+
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                if self.delta and line.startswith(KEYFRAME_PREFIXES):
+                    self.keyframes.append(len(self.offsets))
+                self.offsets.append(offset)
+
+        self._file = open(path, "rb")
+        self._last = None   # (index, record) of the last decoded step
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _line(self, index: int):
+        self._file.seek(self.offsets[index])
+        return json.loads(self._file.readline())
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self.offsets)
+        if not 0 <= index < len(self.offsets):
+            raise IndexError(index)
+        if not self.delta:
+            return self._line(index)
+
+        # Replay from the last decoded step if it is on the way, else from
+        # the nearest keyframe at or before `index`
+        at = bisect.bisect_right(self.keyframes, index)
+        start = self.keyframes[at - 1] if at else 0
+        if self._last is not None and start <= self._last[0] <= index:
+            position, record = self._last
+        else:
+            position, record = start, apply_delta(None, self._line(start))
+
+        while position < index:
+            position += 1
+            record = apply_delta(record, self._line(position))
+
+        self._last = (index, record)
+        return record
+
+    def __iter__(self):
+        for index in range(len(self.offsets)):
+            yield self[index]
+
+    def close(self):
+        self._file.close()
+
+
+# Reader for any step log: binary trace, delta or full JSONL
+def open_steps(path: str):
+    if is_trace(path):
+        return TraceReader(path)
+    return StepLogReader(path)
+
+
+# Keeps the most recently decoded steps of a reader, so scrubbing back and
+# forth over the same stretch of a run does not decode (or replay) it again
+class StepCache:
+    def __init__(self, reader, capacity: int = 128):
+        self.reader = reader
+        self.capacity = capacity
+        self._steps = OrderedDict()
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self.reader)
+        step = self._steps.get(index)
+        if step is not None:
+            self._steps.move_to_end(index)
+            return step
+
+        step = self.reader[index]
+        self._steps[index] = step
+        if len(self._steps) > self.capacity:
+            self._steps.popitem(last=False)
+        return step
+
+    def close(self):
+        self._steps.clear()
+        self.reader.close()
@@ -1,46 +1,24 @@
 
-from kb import KnowledgeBase
 from agent import Agent
 from const import World, AgentState
+from events import ConsoleReporter, EventBus
+from mapio import load_map
+
+BACKENDS = ("z3", "grounded", "propagation")
+
+# Build a knowledge base; the Z3 module is only imported when it is used
+def make_kb(size: int, backend: str = "z3"):
+    if backend == "propagation":
+        from propagation_kb import PropagationKnowledgeBase
+        return PropagationKnowledgeBase(size)
+    if backend in ("z3", "grounded"):
+        from kb import KnowledgeBase
+        return KnowledgeBase(size, grounded=backend == "grounded")
+    raise ValueError(f"Unknown KB backend: {backend}")
 
 
 def load_testcase(filepath: str):
-    with open(filepath, 'r') as file:
-        lines = [line.strip() for line in file if line.strip()]
-    size = int(lines[0])
-    board = [[{} for _ in range(size)] for _ in range(size)]
-    agent_pos = (size-1, 0)
-
-    for i in range(size):
-        row = lines[i+1].split('.')
-        for j, cell in enumerate(row):
-            if 'W' in cell: board[i][j]['wumpus'] = True
-            if 'P_G' in cell: board[i][j]['gas'] = True
-            if 'H_P' in cell: board[i][j]['potion'] = True
-            if 'G' in cell and 'P_G' not in cell: board[i][j]['gold'] = True
-            if 'P' in cell and '_G' not in cell and '_P' not in cell: board[i][j]['pit'] = True
-            if 'A' in cell: agent_pos = (i, j)
-
-    for i in range(size):
-        for j in range(size):
-            if board[i][j].get('wumpus', False):
-                for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
-                    if 0 <= i+dx < size and 0 <= j+dy < size:
-                        board[i+dx][j+dy]['stench'] = True
-            if board[i][j].get('pit', False):
-                for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
-                    if 0 <= i+dx < size and 0 <= j+dy < size:
-                        board[i+dx][j+dy]['breeze'] = True
-            if board[i][j].get('gas', False):
-                for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
-                    if 0 <= i+dx < size and 0 <= j+dy < size:
-                        board[i+dx][j+dy]['whiff'] = True
-            if board[i][j].get('potion', False):
-                for dx, dy in [(1,0), (-1,0), (0,1), (0,-1)]:
-                    if 0 <= i+dx < size and 0 <= j+dy < size:
-                        board[i+dx][j+dy]['glow'] = True
-
-    return board, agent_pos
+    return load_map(filepath)
 
 if __name__ == '__main__':
     test1 = ["testcase1.txt", "testcase2.txt", "testcase3.txt", "testcase4.txt", "testcase5.txt"]
@@ -50,10 +28,12 @@ if __name__ == '__main__':
         
         # Load the board and agent start position from the testcase file
         board, agent_start = load_testcase("input/" + testcase)
-        kb = KnowledgeBase(10)
+        kb = make_kb(len(board))
         world = World(board)
         state = AgentState(location=agent_start)
-        agent = Agent(world, kb, state, output="output/"+testcase.replace('.txt', ''))
+        events = EventBus()
+        events.attach(ConsoleReporter())
+        agent = Agent(world, kb, state, output="output/"+testcase.replace('.txt', ''), events=events)
 
         agent.run() 
 
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from helpers import run_records
+
+
+# Step records of one seeded run, shared by the log format tests
+@pytest.fixture(scope="session")
+def records():
+    return run_records()
@@ -0,0 +1,37 @@
+import json
+
+from agent import Agent
+from const import World, AgentState
+from events import EventBus
+from test import make_kb
+from worldgen import generate_world, hazard_counts
+
+
+# Collects step records as they would read back from a JSON log
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(json.loads(json.dumps(record)))
+
+    def close(self):
+        pass
+
+
+# Step records of a real run on a seeded board
+def run_records(size=8, seed=2, max_steps=300):
+    board, start = generate_world(size, seed, potions=1, **hazard_counts(size, 0.15))
+    sink = ListSink()
+    agent = Agent(World(board), make_kb(size, "propagation"), AgentState(location=start),
+                  events=EventBus(), sink=sink, max_steps=max_steps, max_risk=0.3)
+    agent.run()
+    return sink.records
+
+
+# The agent's visited cells are a set, so logs only keep their membership
+# (traces keep first-visit order); compare records with them sorted
+def normalized(record):
+    record = dict(record)
+    record["visited"] = sorted(map(tuple, record["visited"]))
+    return record
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from agent import Agent
+from const import World, AgentState, board_from_planes
+from events import EventBus, HazardEvent
+from mapio import parse_lines
+from test import BACKENDS, load_testcase, make_kb
+
+INPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input")
+
+
+def run_testcase(name, backend="propagation", **options):
+    board, start = load_testcase(os.path.join(INPUT, name))
+    events = EventBus()
+    hazards = []
+    events.subscribe(HazardEvent, hazards.append)
+    agent = Agent(World(board), make_kb(len(board), backend), AgentState(location=start),
+                  events=events, log_format="none", **options)
+    agent.run()
+    return agent, hazards
+
+
+# The agent shoots at (6,7) while the wumpus is at (7,6), steps into the
+# shot cell and goes on to the gold. The quantified z3 backend takes over a
+# minute on this map and decides the same as the grounded one.
+@pytest.mark.parametrize("backend", ["grounded", "propagation"])
+def test_testcase4_reaches_the_gold_after_a_missed_shot(backend):
+    if backend != "propagation":
+        pytest.importorskip("z3")
+    agent, hazards = run_testcase("testcase4.txt", backend)
+    kinds = [event.kind for event in hazards]
+    assert "shoot" in kinds and "gold" in kinds
+    assert agent.outcome == "climbed"
+    assert agent.state.score == 5000
+    assert agent.kb.is_not_wumpus(6, 7)
+
+
+# A pit and a potion next to the start: the agent must not take the start
+# for percept-free and walk into the pit
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("max_risk", [None, 0.3])
+def test_start_with_percepts_is_not_taken_for_empty(backend, max_risk):
+    if backend != "propagation":
+        pytest.importorskip("z3")
+    size, planes, start = parse_lines(["4", "-.-.P.-", "-.-.-.G", "P.-.-.-", "A.H_P.-.-"])
+    agent = Agent(World(board_from_planes(size, planes)), make_kb(size, backend), AgentState(location=start),
+                  events=EventBus(), log_format="none", max_risk=max_risk)
+    agent.run()
+    assert agent.outcome == "climbed"
+    assert agent.visited == {(3, 0)}
+
+
+def test_agent_state_is_immutable():
+    state = AgentState(location=(2, 1))
+    moved = state.replace(location=(1, 1), hp=2)
+    assert (state.location, state.hp) == ((2, 1), 3)
+    assert (moved.location, moved.hp, moved.arrows) == ((1, 1), 2, 1)
+    assert state.replace() == state
+    with pytest.raises(AttributeError):
+        state.hp = 1
@@ -0,0 +1,42 @@
+import os
+import time
+
+import batch
+from agent import Agent
+
+MAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input", "testcase1.txt")
+
+
+def task(time_limit):
+    return (MAP, "propagation", 1000, time_limit, None, "full", None)
+
+
+def test_run_map_finishes_within_limit():
+    result = batch.run_map(task(60.0))
+    assert "error" not in result
+    assert result["outcome"] in ("climbed", "died")
+
+
+def test_slow_step_is_interrupted(monkeypatch):
+    perceive = Agent.perceive
+
+    def slow_perceive(self, x, y):
+        time.sleep(5)
+        return perceive(self, x, y)
+
+    monkeypatch.setattr(Agent, "perceive", slow_perceive)
+    monkeypatch.setattr(batch, "HARD_LIMIT_GRACE", 0.1)
+    result = batch.run_map(task(0.1))
+    assert "error" not in result
+    assert result["outcome"] == "time_limit"
+    assert result["wall_time"] < 2
+
+
+def test_log_names_are_unique(tmp_path):
+    maps = [os.path.join("a", "map.txt"), os.path.join("b", "map.txt"), "map-1.txt", "other.bin"]
+    names = batch.log_names(maps, "delta")
+    assert names == ["map-0.jsonl", "map-5.jsonl", "map-1.jsonl", "other.jsonl"]
+
+    results = batch.run_batch([MAP, MAP], workers=1, max_steps=50, log_dir=str(tmp_path))
+    assert all("error" not in result for result in results)
+    assert sorted(os.listdir(tmp_path)) == ["testcase1-0.jsonl", "testcase1-1.jsonl"]
@@ -0,0 +1,77 @@
+import pytest
+
+from bintrace import TraceEncoder, TraceReader, is_trace
+from helpers import normalized
+from steplog import FileSink, make_sink, open_steps
+
+
+def write_trace(path, records, board_size, threaded=False):
+    sink = make_sink(str(path), "binary", board_size=board_size) if threaded \
+        else FileSink(str(path), TraceEncoder(board_size))
+    for record in records:
+        sink.write(record)
+    sink.close()
+    return TraceReader(str(path))
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_trace_round_trip(tmp_path, records, threaded):
+    path = tmp_path / "run.wtrace"
+    reader = write_trace(path, records, 8, threaded)
+    assert is_trace(str(path))
+    assert len(reader) == len(records)
+    assert [normalized(r) for r in reader] == [normalized(r) for r in records]
+    # Random access, back to front
+    for index in range(len(records) - 1, -1, -1):
+        assert normalized(reader[index]) == normalized(records[index])
+    assert normalized(reader[-1]) == normalized(records[-1])
+    with pytest.raises(IndexError):
+        reader[len(records)]
+    reader.close()
+
+
+def test_trace_visited_prefix_matches_first_visits(tmp_path, records):
+    reader = write_trace(tmp_path / "run.wtrace", records, 8)
+    order = []
+    for index, record in enumerate(records):
+        order += [cell for cell in record["visited"] if cell not in order]
+        assert reader[index]["visited"] == order
+    reader.close()
+
+
+# Boards of 256x256 and up pack cells into four bytes
+def test_trace_wide_cells_and_missing_fields(tmp_path):
+    records = [
+        {"step": 1, "location": [299, 0], "hp": 3, "potions": 0, "score": -10, "direction": "UP",
+         "arrows": 1, "visited": [[299, 0]], "ranked": [[[298, 0], 5], [[299, 1], -3]], "best": [298, 0],
+         "wumpus": None, "best_wumpus_cell": None, "adjacent_safe_cells": [], "best_adjacent_cell": None,
+         "path": [[298, 0]], "actions": ["MOVE"], "events": ["Grabbed GOLD at (298,0)", "é"]},
+        {"step": 2, "location": [298, 0], "hp": 2, "potions": 1, "score": 990, "direction": "RIGHT",
+         "arrows": 0, "visited": [[299, 0], [298, 0]], "ranked": [], "best": None,
+         "wumpus": [[0, 299]], "best_wumpus_cell": [0, 299], "adjacent_safe_cells": [[1, 299]],
+         "best_adjacent_cell": [1, 299], "path": [], "actions": ["TURN_LEFT", "SHOOT"], "events": []},
+    ]
+    reader = write_trace(tmp_path / "run.wtrace", records, 300)
+    assert reader.cell_width == 4
+    assert list(reader) == records
+    reader.close()
+
+
+def test_open_steps_picks_the_trace_reader(tmp_path, records):
+    path = tmp_path / "run.wtrace"
+    write_trace(path, records, 8).close()
+    reader = open_steps(str(path))
+    assert isinstance(reader, TraceReader)
+    assert normalized(reader[0]) == normalized(records[0])
+    reader.close()
+
+
+def test_unclosed_trace_is_rejected(tmp_path, records):
+    path = tmp_path / "run.wtrace"
+    encoder = TraceEncoder(8)
+    with open(path, "wb") as f:
+        f.write(encoder.header())
+        for record in records:
+            f.write(encoder.encode(record))
+    with pytest.raises(ValueError):
+        TraceReader(str(path))
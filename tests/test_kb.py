@@ -0,0 +1,128 @@
+import random
+
+import pytest
+
+from const import Object, Percept, World
+from propagation_kb import PropagationKnowledgeBase
+from test import BACKENDS, make_kb
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    if request.param != "propagation":
+        pytest.importorskip("z3")
+    return request.param
+
+
+# The start cell may have percepts: they count, and the start stays empty
+def test_start_cell_percepts(backend):
+    kb = make_kb(4, backend)
+    kb.add_initial_state(3, 0)
+    kb.add_percepts(3, 0, [Percept.BREEZE, Percept.GLOW])
+    assert kb.is_safe(3, 0) and kb.is_not_potion(3, 0)
+    for cell in [(2, 0), (3, 1)]:
+        assert not kb.is_not_pit(*cell)
+        assert not kb.is_not_potion(*cell)
+        assert kb.is_not_wumpus(*cell) and kb.is_not_gas(*cell)
+    assert not kb.classify([(2, 0)])[(2, 0)]["safe"]
+
+
+# Stench at (1,1) with no wumpus around it cannot be: the wumpus facts are
+# broken, but pits and gas keep their answers
+def test_contradiction_stays_with_its_object(backend):
+    kb = make_kb(4, backend)
+    kb.add_initial_state(3, 0)
+    kb.add_percepts(3, 0, [])
+    kb.add_percepts(1, 1, [Percept.STENCH, Percept.BREEZE])
+    for cell in [(0, 1), (2, 1), (1, 0), (1, 2)]:
+        kb.add_not_object(Object.WUMPUS, *cell)
+
+    assert kb.is_not_pit(2, 0) and kb.is_not_gas(2, 0)
+    assert not kb.is_not_pit(0, 1)
+    assert kb.is_not_gas(0, 1)
+    # No wumpus cell can be proven empty beyond the ones said to be
+    assert not kb.is_not_wumpus(3, 3) and not kb.is_not_wumpus(2, 0)
+    assert kb.is_not_wumpus(0, 1) and kb.is_not_wumpus(3, 0)
+    flags = kb.classify([(0, 1), (3, 3)])
+    assert flags[(0, 1)]["pit"] and not flags[(0, 1)]["wumpus"]
+    assert flags[(3, 3)]["wumpus"] and not flags[(3, 3)]["safe"]
+
+
+# A map may lack an object altogether: seeing that is no contradiction
+def test_board_without_hazards(backend):
+    kb = make_kb(3, backend)
+    kb.add_initial_state(2, 0)
+    for x in range(3):
+        for y in range(3):
+            kb.add_percepts(x, y, [])
+    facts = kb if backend == "propagation" else kb._facts
+    assert not facts.inconsistent
+    assert all(kb.is_safe(x, y) for x in range(3) for y in range(3))
+
+
+OBJECTS = [Object.PIT, Object.WUMPUS, Object.GAS, Object.POTION]
+CHECKS = {
+    Object.PIT: "is_not_pit",
+    Object.WUMPUS: "is_not_wumpus",
+    Object.GAS: "is_not_gas",
+    Object.POTION: "is_not_potion",
+}
+
+
+def answers(kb, cells):
+    return {cell: [getattr(kb, CHECKS[obj])(*cell) for obj in OBJECTS] + [kb.is_safe(*cell)]
+            for cell in cells}
+
+
+# Walk a random 3x3 world (when noisy, with stray percepts that need not
+# fit any world), killing wumpuses on the way. After every fact each
+# backend must answer classify and the is_* checks as the propagation KB
+# does, whether the answer was cached or not.
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("noisy", [False, True])
+def test_backends_agree_with_propagation(backend, seed, noisy):
+    rng = random.Random(seed)
+    size, start = 3, (2, 0)
+    planes = {obj.value.lower(): bytearray(rng.random() < 0.2 for _ in range(size * size)) for obj in OBJECTS}
+    for plane in planes.values():
+        plane[start[0] * size + start[1]] = 0
+    world = World.from_planes(size, planes)
+    cells = [(x, y) for x in range(size) for y in range(size)]
+
+    kb, reference = make_kb(size, backend), PropagationKnowledgeBase(size)
+    for step in range(10):
+        roll = rng.random()
+        wumpuses = [cell for cell in cells if world.has_object(Object.WUMPUS, *cell)]
+        if step == 0:
+            facts = [("add_initial_state", *start), ("add_percepts", *start, world.percept_at(*start))]
+        elif roll < 0.15 and wumpuses:
+            cell = rng.choice(wumpuses)
+            world.remove_wumpus(*cell)
+            facts = [("remove_wumpus", *cell)]
+        elif roll < 0.25:
+            cell = rng.choice(cells)
+            obj = rng.choice([obj for obj in OBJECTS if world.has_object(obj, *cell)] or [None])
+            facts = [("add_object", obj, *cell)] if obj else [("add_not_object", Object.POTION, *cell)]
+        else:
+            cell = rng.choice([cell for cell in cells if not any(
+                world.has_object(obj, *cell) for obj in (Object.PIT, Object.WUMPUS, Object.GAS))])
+            percepts = world.percept_at(*cell)
+            if noisy and rng.random() < 0.5:
+                percepts = percepts + [rng.choice([Percept.STENCH, Percept.BREEZE, Percept.WHIFF, Percept.GLOW])]
+            facts = [("assume_safe", *cell), ("add_percepts", *cell, percepts)]
+
+        for name, *args in facts:
+            getattr(kb, name)(*args)
+            getattr(reference, name)(*args)
+
+        expected = answers(reference, cells)
+        # Odd steps ask per cell first and classify from the cache, even
+        # steps the other way round
+        if step % 2:
+            assert answers(kb, cells) == expected
+        assert kb.classify(cells) == reference.classify(cells)
+        hits = getattr(kb, "cache_hits", 0)
+        assert answers(kb, cells) == expected
+        assert kb.classify(cells) == reference.classify(cells)
+        if backend != "propagation" and not kb._unsound():
+            assert kb.cache_hits > hits
@@ -0,0 +1,101 @@
+import glob
+import os
+import struct
+
+import pytest
+
+import mapio
+import worldgen
+from mapio import MapBundle, TRAILER, load_map, map_name, map_size, parse_map, write_bundle
+
+INPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input")
+MAPS = sorted(glob.glob(os.path.join(INPUT, "*.txt")))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    path = str(tmp_path / "maps.wmaps")
+    assert write_bundle(path, ((map_name(p), read(p)) for p in MAPS)) == len(MAPS)
+    bundle = MapBundle(path)
+    yield bundle
+    bundle.close()
+
+
+def test_bundle_round_trip(bundle):
+    assert len(bundle) == len(MAPS)
+    for index, path in enumerate(MAPS):
+        text = read(path)
+        assert bundle.text(index) == (text if text.endswith("\n") else text + "\n")
+        assert bundle.name(index) == map_name(path)
+        assert bundle.parse(index) == parse_map(path)
+        assert bundle.load(index) == load_map(path)
+
+
+def test_bundle_offset_index(bundle):
+    with open(bundle.path, "rb") as f:
+        data = f.read()
+    index_offset, names_offset, count, end = TRAILER.unpack_from(data, len(data) - TRAILER.size)
+    assert end == mapio.END_MAGIC and count == len(MAPS)
+    offsets = struct.unpack_from(f"<{count}Q", data, index_offset)
+    assert offsets[0] == len(mapio.BUNDLE_MAGIC)
+    # Every map starts at its offset and ends where the next one starts
+    for index, offset in enumerate(offsets):
+        end = offsets[index + 1] if index + 1 < count else index_offset
+        assert data[offset:end].decode("utf-8") == bundle.text(index)
+    assert data[names_offset:len(data) - TRAILER.size].decode("utf-8").split("\n") == [map_name(p) for p in MAPS]
+
+
+def test_bundle_addresses(bundle):
+    paths = bundle.paths()
+    assert paths == [f"{bundle.path}#{index}" for index in range(len(MAPS))]
+    for address, path in zip(paths, MAPS):
+        assert parse_map(address) == parse_map(path)
+        assert map_size(address) == map_size(path)
+        assert map_name(address) == map_name(path)
+    assert mapio.is_bundle(bundle.path) and not mapio.is_bundle(MAPS[0])
+    with pytest.raises(IndexError):
+        bundle.text(len(MAPS))
+
+
+def test_generated_bundle_matches_text_maps(tmp_path):
+    counts = worldgen.hazard_counts(12, 0.1)
+    [path] = worldgen.write_maps(str(tmp_path / "bundle"), 20, seed=7, fmt="bundle", size=12, **counts)
+    texts = worldgen.write_maps(str(tmp_path / "text"), 20, seed=7, fmt="txt", size=12, **counts)
+    bundle = MapBundle(path)
+    for index, text_path in enumerate(texts):
+        assert bundle.name(index) == map_name(text_path)
+        assert bundle.load(index) == load_map(text_path)
+    bundle.close()
+
+
+def test_empty_bundle(tmp_path):
+    path = str(tmp_path / "empty.wmaps")
+    assert write_bundle(path, []) == 0
+    bundle = MapBundle(path)
+    assert len(bundle) == 0 and bundle.paths() == []
+    bundle.close()
+
+
+def test_bad_bundles_are_rejected(tmp_path):
+    path = str(tmp_path / "maps.wmaps")
+    write_bundle(path, [("a", read(MAPS[0]))])
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-2])
+    with pytest.raises(ValueError):
+        MapBundle(path)
+    with pytest.raises(ValueError):
+        write_bundle(str(tmp_path / "other.wmaps"), [("two\nlines", read(MAPS[0]))])
+
+
+def test_tokens_and_filler():
+    size, planes, agent = mapio.parse_lines(["3", "AP_G.-G.g", "PH_P.W", "-.-.-"])
+    assert size == 3 and agent == (0, 0)
+    marked = {obj: [divmod(i, size) for i, v in enumerate(plane) if v] for obj, plane in planes.items()}
+    assert marked == {"pit": [(1, 0)], "wumpus": [(1, 1)], "gold": [(0, 1)], "gas": [(0, 0)], "potion": [(1, 0)]}
@@ -0,0 +1,68 @@
+import itertools
+import random
+
+import pytest
+
+from probability import CLAUSE_LIMIT, ModelCounter, object_probabilities, split_components
+
+
+# Chance that the clauses hold, and that each cell holds the object given
+# they do, by enumerating every assignment of the cells
+def brute_force(clauses, prior):
+    cells = sorted(set().union(*clauses)) if clauses else []
+    total = 0.0
+    weights = dict.fromkeys(cells, 0.0)
+    for bits in itertools.product([False, True], repeat=len(cells)):
+        holds = {cell for cell, bit in zip(cells, bits) if bit}
+        if all(clause & holds for clause in clauses):
+            weight = prior ** len(holds) * (1 - prior) ** (len(cells) - len(holds))
+            total += weight
+            for cell in holds:
+                weights[cell] += weight
+    return total, {cell: weight / total for cell, weight in weights.items()}
+
+
+def random_clauses(rng, cells=9, max_clauses=6):
+    return frozenset(frozenset(rng.sample(range(cells), rng.randint(1, CLAUSE_LIMIT)))
+                     for _ in range(rng.randint(1, max_clauses)))
+
+
+@pytest.mark.parametrize("prior", [0.025, 0.2, 0.5])
+def test_marginals_match_brute_force(prior):
+    rng = random.Random(prior)
+    counter = ModelCounter(prior)
+    for _ in range(200):
+        clauses = random_clauses(rng)
+        total, expected = brute_force(clauses, prior)
+        assert counter.count(clauses) == pytest.approx(total)
+        assert counter.marginals(clauses) == pytest.approx(expected)
+    # marginals reuses the counts memoised by count
+    assert counter.hits
+
+
+def test_small_cache_gives_the_same_answers():
+    rng = random.Random(3)
+    counter = ModelCounter(0.1, max_entries=4)
+    for _ in range(50):
+        clauses = random_clauses(rng, cells=12, max_clauses=8)
+        assert counter.marginals(clauses) == pytest.approx(brute_force(clauses, 0.1)[1])
+
+
+def test_components_share_no_cell():
+    clauses = frozenset([frozenset({1, 2}), frozenset({2, 3}), frozenset({5}), frozenset({6, 7}), frozenset({7})])
+    components = split_components(clauses)
+    assert sorted(sorted(set().union(*c)) for c in components) == [[1, 2, 3], [5], [6, 7]]
+    assert frozenset().union(*components) == clauses
+
+
+def test_object_probabilities_of_known_and_free_cells():
+    UNKNOWN, SAFE, HAZARD = 0, 1, 2
+    state = [UNKNOWN, SAFE, HAZARD, UNKNOWN, UNKNOWN, UNKNOWN]
+    # The long "somewhere on the board" clause is left out of the count
+    clauses = [[0, 3], None, list(range(CLAUSE_LIMIT + 1))]
+    counter = ModelCounter(0.2)
+    result = object_probabilities(counter, state, clauses, range(6), SAFE, HAZARD)
+    expected = brute_force(frozenset([frozenset({0, 3})]), 0.2)[1]
+    assert result[1] == 0.0 and result[2] == 1.0
+    assert result[0] == pytest.approx(expected[0]) and result[3] == pytest.approx(expected[3])
+    assert result[4] == result[5] == 0.2
@@ -0,0 +1,68 @@
+import pytest
+
+from agent import Agent
+from benchmark import TimedKB, run_one
+from const import World, AgentState
+from events import EventBus
+from profiler import AGENT_PHASES, KB_PHASES, Profiler
+from test import make_kb
+from worldgen import generate_world, hazard_counts
+
+
+# Seed 2 on this board shoots a wumpus and takes a risky step, so every
+# agent phase runs
+def profiled_run(backend, tmp_path, seed=2, before_attach=None):
+    board, start = generate_world(8, seed, potions=1, **hazard_counts(8, 0.15))
+    kb = TimedKB(make_kb(8, backend))
+    agent = Agent(World(board), kb, AgentState(location=start), events=EventBus(),
+                  output=str(tmp_path / "log"), log_format="delta", max_steps=500, max_risk=0.3)
+    if before_attach:
+        before_attach(kb._kb)
+    profiler = Profiler().attach(agent, kb=kb._kb)
+    agent.run()
+    return profiler, kb
+
+
+def test_every_declared_phase_is_sampled(tmp_path):
+    profiler, kb = profiled_run("propagation", tmp_path)
+    assert profiler.declared == set(AGENT_PHASES.values()) | {"kb_update", "kb_classify", "kb_probability"}
+    assert profiler.missing() == []
+    # The proxy still counts the calls the profiler times
+    assert kb.queries and kb.updates
+
+
+@pytest.mark.parametrize("backend", ["z3", "grounded"])
+def test_solver_checks_are_sampled_behind_the_proxy(backend, tmp_path):
+    pytest.importorskip("z3")
+    profiler, _ = profiled_run(backend, tmp_path)
+    assert set(KB_PHASES.values()) <= profiler.declared
+    phases = profiler.report()["phases"]
+    # The agent's queries are answered by classify's batches and the cache
+    for phase in ["solver_batch", "kb_update", "kb_classify"]:
+        assert phases[phase]["calls"] > 0
+
+
+# Each solver call is counted once, in its own phase
+def test_solver_checks_are_counted_once(tmp_path):
+    pytest.importorskip("z3")
+    calls = {"_check": 0, "_check_cells": 0}
+
+    def count(kb):
+        for method in calls:
+            original = getattr(kb, method)
+
+            def counted(*args, method=method, original=original):
+                calls[method] += 1
+                return original(*args)
+
+            setattr(kb, method, counted)
+
+    profiler, _ = profiled_run("grounded", tmp_path, before_attach=count)
+    phases = profiler.report()["phases"]
+    assert phases.get("solver_check", {"calls": 0})["calls"] == calls["_check"]
+    assert phases["solver_batch"]["calls"] == calls["_check_cells"] > 0
+
+
+def test_benchmark_profile_reports_kb_phases():
+    run = run_one(6, 0.1, 0, "propagation", 200, profile=True)
+    assert {"perceive", "find_best_cell", "kb_update", "kb_classify"} <= run["phases"].keys()
@@ -0,0 +1,91 @@
+import itertools
+import random
+
+import pytest
+
+from const import Object
+from propagation_kb import PERCEPT_OF, PropagationKnowledgeBase
+
+SIZE = 3
+CELLS = [(x, y) for x in range(SIZE) for y in range(SIZE)]
+
+
+def neighbors(x, y):
+    return [(x + dx, y + dy) for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]
+            if 0 <= x + dx < SIZE and 0 <= y + dy < SIZE]
+
+
+def percepts_at(world, x, y):
+    return [percept for obj, percept in PERCEPT_OF.items()
+            if any(cell in world[obj] for cell in neighbors(x, y))]
+
+
+# Random world with every object somewhere, and the percepts of some cells
+def random_case(rng):
+    world = {obj: set(rng.sample(CELLS, rng.randint(1, 3))) for obj in PERCEPT_OF}
+    seen = rng.sample(CELLS, rng.randint(1, 5))
+    return world, seen
+
+
+# Cells where `obj` holds in some arrangement that fits the percepts, the
+# cells known empty and the "somewhere on the board" rule
+def possible_cells(obj, observations, empty):
+    possible = set()
+    for bits in itertools.product([False, True], repeat=len(CELLS)):
+        holds = {cell for cell, bit in zip(CELLS, bits) if bit}
+        if not holds or holds & empty:
+            continue
+        if all(any(n in holds for n in neighbors(*cell)) == (PERCEPT_OF[obj] in percepts)
+               for cell, percepts in observations.items()):
+            possible |= holds
+    return possible
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_queries_match_brute_force(seed):
+    rng = random.Random(seed)
+    world, seen = random_case(rng)
+    kb = PropagationKnowledgeBase(SIZE)
+    observations = {}
+    for x, y in seen:
+        observations[(x, y)] = percepts_at(world, x, y)
+        kb.add_percepts(x, y, observations[(x, y)])
+    empty = {obj: set(rng.sample(sorted(set(CELLS) - world[obj]), 2)) for obj in PERCEPT_OF}
+    for obj, cells in empty.items():
+        for cell in cells:
+            kb.add_not_object(obj, *cell)
+    assert not kb.inconsistent
+
+    for obj in PERCEPT_OF:
+        possible = possible_cells(obj, observations, empty[obj])
+        assert world[obj] <= possible
+        for x, y in CELLS:
+            assert kb._possible(obj, x, y) == ((x, y) in possible)
+
+
+# After a kill the stench field changes; later percepts must not contradict
+# what the KB kept, and the wumpuses left must stay possible
+@pytest.mark.parametrize("seed", range(40))
+def test_remove_wumpus_stays_consistent(seed):
+    rng = random.Random(seed)
+    world, seen = random_case(rng)
+    kb = PropagationKnowledgeBase(SIZE)
+    for x, y in seen:
+        kb.add_percepts(x, y, percepts_at(world, x, y))
+
+    for killed in rng.sample(sorted(world[Object.WUMPUS]), len(world[Object.WUMPUS])):
+        world[Object.WUMPUS].discard(killed)
+        kb.remove_wumpus(*killed)
+        assert kb.is_not_wumpus(*killed)
+        for x, y in rng.sample(CELLS, 3):
+            kb.add_percepts(x, y, percepts_at(world, x, y))
+        assert not kb.inconsistent
+        for cell in CELLS:
+            if cell in world[Object.WUMPUS]:
+                assert not kb.is_not_wumpus(*cell)
+
+    # With every wumpus dead, nothing the agent sees brings one back
+    for x, y in CELLS:
+        kb.add_percepts(x, y, percepts_at(world, x, y))
+    assert not kb.inconsistent
+    assert all(kb.is_not_wumpus(*cell) for cell in CELLS)
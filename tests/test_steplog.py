@@ -0,0 +1,171 @@
+import json
+import os
+
+import pytest
+
+from agent import Agent
+from const import World, AgentState
+from events import EventBus
+from helpers import ListSink, normalized
+from steplog import (RANKED_KEYS, DeltaEncoder, FileSink, JsonlEncoder, StepCache, StepLogReader, ThreadedSink,
+                     apply_ranked, make_sink, open_steps, ranked_delta)
+from test import load_testcase, make_kb
+
+
+INPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input")
+
+
+def write(path, records, sink):
+    for record in records:
+        sink.write(record)
+    sink.close()
+    return StepLogReader(str(path))
+
+
+@pytest.mark.parametrize("keyframe_every", [1, 3, 50])
+def test_delta_round_trip(tmp_path, records, keyframe_every):
+    reader = write(tmp_path / "log.jsonl", records, FileSink(str(tmp_path / "log.jsonl"), DeltaEncoder(keyframe_every)))
+    assert reader.delta
+    assert reader.keyframes == list(range(0, len(records), keyframe_every))
+    assert len(reader) == len(records)
+    assert [normalized(r) for r in reader] == [normalized(r) for r in records]
+    reader.close()
+
+
+def test_delta_random_access_across_keyframes(tmp_path, records):
+    reader = write(tmp_path / "log.jsonl", records, FileSink(str(tmp_path / "log.jsonl"), DeltaEncoder(3)))
+    # Backwards, and around every keyframe boundary, so both the replay from
+    # the last decoded step and the jump to a keyframe are taken
+    order = list(range(len(records) - 1, -1, -1))
+    order += [i for k in range(3, len(records), 3) for i in (k - 1, k, k + 1, k - 2) if i < len(records)]
+    for index in order:
+        assert normalized(reader[index]) == normalized(records[index])
+    assert normalized(reader[-1]) == normalized(records[-1])
+    with pytest.raises(IndexError):
+        reader[len(records)]
+    reader.close()
+
+
+def test_delta_writes_only_changes(tmp_path, records):
+    path = tmp_path / "log.jsonl"
+    write(path, records, FileSink(str(path), DeltaEncoder(50))).close()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert lines[0]["format"] == "wumpus-delta" and lines[0]["keyframe_every"] == 50
+    for index, line in enumerate(lines[1:]):
+        if index % 50 == 0:
+            assert line["k"] == 1 and "visited" in line
+        else:
+            assert "k" not in line and "visited" not in line and "ranked" not in line
+            assert line.keys() < records[index].keys() | {"visited+", *RANKED_KEYS}
+
+
+# Ranked frontiers that keep, drop, add and re-rank cells, with ties
+@pytest.mark.parametrize("previous, ranked", [
+    ([[[0, 1], 5], [[1, 0], 3]], [[[0, 1], 4], [[1, 0], 3]]),
+    ([[[0, 1], 5], [[1, 0], 3]], [[[1, 0], 3], [[0, 1], 3]]),
+    ([[[0, 1], 5], [[1, 0], 3]], [[[2, 2], 7], [[1, 0], 3]]),
+    ([[[0, 1], 5], [[1, 0], 5], [[2, 0], 5]], [[[2, 0], 5], [[0, 1], 5], [[1, 0], 5]]),
+    ([[[0, 1], 5]], []),
+    ([], [[[0, 1], 5], [[3, 3], -2]]),
+    ([[[0, 1], 5], [[1, 0], 3]], [[[3, 1], 1], [[3, 2], 0]]),
+])
+def test_ranked_delta_round_trip(previous, ranked):
+    delta = ranked_delta(previous, ranked)
+    assert delta.keys() <= set(RANKED_KEYS)
+    assert apply_ranked(previous, delta) == ranked
+
+
+def test_delta_log_is_compact():
+    board, start = load_testcase(os.path.join(INPUT, "testcase6.txt"))
+    sink = ListSink()
+    Agent(World(board), make_kb(len(board), "propagation"), AgentState(location=start),
+          events=EventBus(), sink=sink).run()
+    full = sum(len(JsonlEncoder().encode(record)) for record in sink.records)
+    encoder = DeltaEncoder()
+    delta = len(encoder.header()) + sum(len(encoder.encode(record)) for record in sink.records)
+    assert delta * 3.5 < full
+
+
+# Version 1 delta logs put spaces after separators
+def test_reads_version_1_delta_log(tmp_path):
+    path = tmp_path / "old.jsonl"
+    path.write_text('{"format": "wumpus-delta", "version": 1, "keyframe_every": 2}\n'
+                    '{"k": 1, "step": 1, "hp": 3, "ranked": [[[0, 1], 5]], "visited": [[0, 0]]}\n'
+                    '{"step": 2, "ranked": [[[0, 1], 4]], "visited+": [[0, 1]]}\n'
+                    '{"k": 1, "step": 3, "hp": 2, "ranked": [], "visited": [[0, 0], [0, 1]]}\n')
+    reader = StepLogReader(str(path))
+    assert reader.keyframes == [0, 2]
+    assert reader[1] == {"step": 2, "hp": 3, "ranked": [[[0, 1], 4]], "visited": [[0, 0], [0, 1]]}
+    assert reader[2]["hp"] == 2
+    reader.close()
+
+
+def test_delta_keeps_visited_that_shrinks(tmp_path):
+    records = [{"step": 1, "hp": 3, "visited": [[0, 0], [0, 1]]},
+               {"step": 2, "hp": 2, "visited": [[0, 0]]},
+               {"step": 3, "hp": 2, "visited": [[0, 0], [1, 0]]}]
+    reader = write(tmp_path / "log.jsonl", records, FileSink(str(tmp_path / "log.jsonl"), DeltaEncoder(10)))
+    assert list(reader) == records
+    reader.close()
+
+
+@pytest.mark.parametrize("log_format", ["full", "delta"])
+def test_threaded_sink_round_trip(tmp_path, records, log_format):
+    path = tmp_path / "log.jsonl"
+    sink = make_sink(str(path), log_format)
+    assert isinstance(sink, ThreadedSink)
+    reader = write(path, records, sink)
+    assert reader.delta == (log_format == "delta")
+    assert [normalized(r) for r in reader] == [normalized(r) for r in records]
+    reader.close()
+
+
+def test_open_steps_reads_full_jsonl(tmp_path, records):
+    path = tmp_path / "log.jsonl"
+    write(path, records, FileSink(str(path))).close()
+    reader = open_steps(str(path))
+    assert isinstance(reader, StepLogReader) and not reader.delta
+    assert list(reader) == records
+    reader.close()
+
+
+# Counts the steps the cache had to fetch from the reader
+class CountingReader:
+    def __init__(self, records):
+        self.records = records
+        self.reads = []
+        self.closed = False
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        self.reads.append(index)
+        return self.records[index]
+
+    def close(self):
+        self.closed = True
+
+
+def test_step_cache_keeps_recent_steps(records):
+    reader = CountingReader(records)
+    cache = StepCache(reader, capacity=4)
+    assert len(cache) == len(records)
+    for index in [0, 1, 2, 3, 2, 1, 0, -1]:
+        assert cache[index] == records[index]
+    assert reader.reads == [0, 1, 2, 3, len(records) - 1]
+
+    # Step 3 was the least recently used and made room for the last step
+    cache[3]
+    assert reader.reads[-1] == 3
+    cache.close()
+    assert reader.closed
+
+
+def test_step_cache_over_a_delta_log(tmp_path, records):
+    path = tmp_path / "log.jsonl"
+    reader = write(path, records, FileSink(str(path), DeltaEncoder(3)))
+    cache = StepCache(reader, capacity=8)
+    for index in list(range(len(records))) + list(range(len(records) - 1, -1, -1)):
+        assert normalized(cache[index]) == normalized(records[index])
+    cache.close()
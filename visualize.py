@@ -1,59 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import time
-from PIL import Image, ImageTk, ImageDraw
 import os
-from itertools import cycle
-import io
+from const import marked
+from mapio import parse_map
+from steplog import StepCache, open_steps
+from render import COLORS, SYMBOLS, FrameRenderer, cell_looks, export_animation
 
-BOARD_SIZE = 10
+BOARD_SIZE = 10  # Default; the loaded map's size takes over
 CELL_SIZE = 75
 AUTO_STEP_DELAY = 1000  # ms between auto steps
 MINI_CELL_SIZE = 20  # Size for mini world cells
 
-# Directional arrows and entity symbols
-SYMBOLS = {
-    "UP": "↑",
-    "DOWN": "↓",
-    "LEFT": "←",
-    "RIGHT": "→",
-    "WUMPUS": "W",
-    "PIT": "P",
-    "GOLD": "★",
-    "BREEZE": "~",
-    "STENCH": "S",
-    "POTION": "P",
-    "GAS": "G",
-}
-
-COLORS = {
-    "visited": "#d0f0d0",
-    "current": "#a0d0ff",
-    "inpath": "#fceabb",
-    "best": "#ffcc99",
-
-    "wumpus": "#ff6666",
-    "pit": "#333333",
-    "gold": "#ffcc00",
-    "breeze": "#e6f9ff",
-    "stench": "#ffeb99",
-    "potion": "#ff99cc",
-    "gas": "#99ff99",
-    "empty": "#f0f0f0",
-}
-
 class AgentVisualizer:
     def __init__(self, root, log_file, txt_file):
         self.root = root
         self.root.title("Wumpus Agent Visualizer Pro")
+        self.log_file = log_file
+        self.txt_file = txt_file
         
         
-        # Load JSONL steps
+        # Index the log (full or delta JSONL, or a binary trace); steps are
+        # decoded when drawn and the recent ones kept for the step slider
         try:
-            with open(log_file, 'r') as f:
-                self.steps = [json.loads(line) for line in f]
-                print("First step:", self.steps[0] if self.steps else "No steps found")
+            self.steps = StepCache(open_steps(log_file))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load log file: {str(e)}")
             self.root.destroy()
@@ -63,10 +32,16 @@ class AgentVisualizer:
         self.auto_playing = False
         self.auto_play_id = None
         self.zoom_level = 1.0
+        self.auto_step_delay = AUTO_STEP_DELAY
         self.pan_start = None
+        self.board_size = BOARD_SIZE
         self.world_state = self.load_world(txt_file)  # Adjust path as needed
+        # Keep the mini map about the same size on large boards
+        self.mini_cell_size = max(2, min(MINI_CELL_SIZE, BOARD_SIZE * MINI_CELL_SIZE // self.board_size))
 
         self.alert_frames = []  # Track active alerts
+        self.cell_items = {}    # (x, y) -> (rectangle, text) canvas items
+        self.drawn_looks = {}   # (x, y) -> look currently shown on the canvas
         
         # Set up main UI
         self.create_widgets()
@@ -107,7 +82,7 @@ class AgentVisualizer:
             height=600,
             xscrollcommand=self.hscroll.set,
             yscrollcommand=self.vscroll.set,
-            scrollregion=(0, 0, BOARD_SIZE*CELL_SIZE, BOARD_SIZE*CELL_SIZE)
+            scrollregion=(0, 0, self.board_size*CELL_SIZE, self.board_size*CELL_SIZE)
         )
         
         self.hscroll.pack(side=tk.BOTTOM, fill=tk.X)
@@ -144,8 +119,8 @@ class AgentVisualizer:
         
         self.mini_world_canvas = tk.Canvas(
             self.mini_world_frame,
-            width=BOARD_SIZE*MINI_CELL_SIZE,
-            height=BOARD_SIZE*MINI_CELL_SIZE,
+            width=self.board_size*self.mini_cell_size,
+            height=self.board_size*self.mini_cell_size,
             bg="white"
         )
         self.mini_world_canvas.pack()
@@ -252,74 +227,40 @@ class AgentVisualizer:
     
     def draw_grid(self):
         self.canvas.delete("grid")
-        for i in range(BOARD_SIZE):
-            for j in range(BOARD_SIZE):
+        for i in range(self.board_size):
+            for j in range(self.board_size):
                 x0, y0 = j * CELL_SIZE, i * CELL_SIZE
                 x1, y1 = x0 + CELL_SIZE, y0 + CELL_SIZE
                 self.canvas.create_rectangle(x0, y0, x1, y1, outline="black", tags="grid")
     
     def load_world(self, file_path):
         try:
-            with open(file_path, 'r') as f:
-                lines = [line.strip() for line in f.readlines() if line.strip()]
-                
-                # First line is the board size
-                board_size = int(lines[0])
-                
-                # Initialize empty world
-                world = {
-                    "wumpus": [],
-                    "pit": [],
-                    "gold": [],
-                    "gas": [],
-                    "potion": [],
-                    "walls": set(),
-                    "agent": [],
-                }
-                
-                # Parse each row
-                for row in range(board_size):
-                    if row + 1 >= len(lines):
-                        break
-                        
-                    cells = lines[row + 1].split('.')
-                    for col in range(min(len(cells), board_size)):
-                        cell = cells[col]
-                        
-                        if 'W' in cell:
-                            world["wumpus"].append([row, col])
-                        if 'P' in cell and 'G' not in cell and 'H' not in cell:
-                            world["pit"].append([row, col])
-                        if 'G' in cell and 'H' not in cell and 'P' not in cell:
-                            world["gold"].append([row, col])
-                        if 'A' in cell:
-                            world["agent"] = [row, col]
-                        if 'H_P' in cell:
-                            world["potion"].append([row, col])
-                        if 'P_G' in cell:
-                            world["gas"].append([row, col])
-
-                    for i in range(BOARD_SIZE):
-                        world["walls"].add((i, -1))
-                        world["walls"].add((i, BOARD_SIZE))
-                        world["walls"].add((-1, i))
-                        world["walls"].add((BOARD_SIZE, i))
-
-                return world
-                
+            board_size, planes, agent = parse_map(file_path)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load world file: {str(e)}")
             return None
 
+        self.board_size = board_size
+        world = {obj: [list(divmod(index, board_size)) for index in marked(plane)]
+                 for obj, plane in planes.items()}
+        world["agent"] = list(agent)
+        world["walls"] = set()
+        for i in range(board_size):
+            world["walls"].add((i, -1))
+            world["walls"].add((i, board_size))
+            world["walls"].add((-1, i))
+            world["walls"].add((board_size, i))
+        return world
+
     def draw_mini_world(self):
         """Draw the complete world state in the mini view"""
         self.mini_world_canvas.delete("grid", "entity")
                 
         # Draw grid
-        for i in range(BOARD_SIZE):
-            for j in range(BOARD_SIZE):
-                x0, y0 = j * MINI_CELL_SIZE, i * MINI_CELL_SIZE
-                x1, y1 = x0 + MINI_CELL_SIZE, y0 + MINI_CELL_SIZE
+        for i in range(self.board_size):
+            for j in range(self.board_size):
+                x0, y0 = j * self.mini_cell_size, i * self.mini_cell_size
+                x1, y1 = x0 + self.mini_cell_size, y0 + self.mini_cell_size
                 self.mini_world_canvas.create_rectangle(
                     x0, y0, x1, y1,
                     outline="#cccccc", fill=COLORS["empty"], tags="grid"
@@ -327,56 +268,82 @@ class AgentVisualizer:
         
         # Draw entities
         for (x, y) in self.world_state["wumpus"]:
-            if 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+            if 0 <= x < self.board_size and 0 <= y < self.board_size:
                 self.draw_mini_entity(x, y, COLORS["wumpus"], SYMBOLS["WUMPUS"])
         
         for (x, y) in self.world_state["pit"]:
-            if 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+            if 0 <= x < self.board_size and 0 <= y < self.board_size:
                 self.draw_mini_entity(x, y, COLORS["pit"], SYMBOLS["PIT"])
         
         for (x, y) in self.world_state["gold"]:
-            if 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+            if 0 <= x < self.board_size and 0 <= y < self.board_size:
                 self.draw_mini_entity(x, y, COLORS["gold"], SYMBOLS["GOLD"])
 
         for (x, y) in self.world_state["gas"]:
-            if 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+            if 0 <= x < self.board_size and 0 <= y < self.board_size:
                 self.draw_mini_entity(x, y, COLORS["gas"], SYMBOLS["GAS"])
                 
         for (x, y) in self.world_state["potion"]:
-            if 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+            if 0 <= x < self.board_size and 0 <= y < self.board_size:
                 self.draw_mini_entity(x, y, COLORS["potion"], SYMBOLS["POTION"])
 
         # Draw agent (Default direction is UP)
         if self.world_state["agent"]:
             agent_x, agent_y = self.world_state["agent"]
-            if 0 <= agent_x < BOARD_SIZE and 0 <= agent_y < BOARD_SIZE:
+            if 0 <= agent_x < self.board_size and 0 <= agent_y < self.board_size:
                 self.draw_mini_entity(agent_x, agent_y, COLORS["current"], SYMBOLS["UP"])
     
     def draw_mini_entity(self, x, y, color, symbol):
         """Draw an entity in the mini world view"""
-        x0, y0 = y * MINI_CELL_SIZE, x * MINI_CELL_SIZE
-        x1, y1 = x0 + MINI_CELL_SIZE, y0 + MINI_CELL_SIZE
+        x0, y0 = y * self.mini_cell_size, x * self.mini_cell_size
+        x1, y1 = x0 + self.mini_cell_size, y0 + self.mini_cell_size
         self.mini_world_canvas.create_rectangle(
             x0, y0, x1, y1,
             fill=color, outline="black", tags="entity"
         )
         self.mini_world_canvas.create_text(
-            x0 + MINI_CELL_SIZE//2, y0 + MINI_CELL_SIZE//2,
+            x0 + self.mini_cell_size//2, y0 + self.mini_cell_size//2,
             text=symbol, font=("Arial", 8), tags="entity"
         )
 
 
-    def draw_step(self):
-        self.canvas.delete("cell")
-        self.canvas.delete("entity")
-        self.canvas.delete("agent")
+    def apply_looks(self, looks):
+        """Reconfigure only the cells whose look changed since the last drawn step"""
+        for cell in self.drawn_looks.keys() - looks.keys():
+            rect, text = self.cell_items[cell]
+            self.canvas.itemconfigure(rect, state=tk.HIDDEN)
+            self.canvas.itemconfigure(text, state=tk.HIDDEN)
+
+        for cell, look in looks.items():
+            if self.drawn_looks.get(cell) == look:
+                continue
+            fill, symbol, color, font_size = look
+            items = self.cell_items.get(cell)
+            if items is None:
+                # Canvas items for a cell are created the first time it is drawn
+                x0, y0 = cell[1] * CELL_SIZE, cell[0] * CELL_SIZE
+                items = (
+                    self.canvas.create_rectangle(x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE, tags="cell"),
+                    self.canvas.create_text(x0 + CELL_SIZE//2, y0 + CELL_SIZE//2, tags="cell"),
+                )
+                self.cell_items[cell] = items
+            rect, text = items
+            self.canvas.itemconfigure(rect, fill=fill, state=tk.NORMAL)
+            if symbol:
+                self.canvas.itemconfigure(text, text=symbol, font=("Arial", font_size, "bold"),
+                                          fill=color, state=tk.NORMAL)
+            else:
+                self.canvas.itemconfigure(text, state=tk.HIDDEN)
 
+        self.drawn_looks = looks
+
+    def draw_step(self):
         if self.current_step >= len(self.steps):
+            self.apply_looks({})
             self.info_label.config(text="🎉 Simulation complete.")
             return
 
         step = self.steps[self.current_step]
-        visited = step.get("visited", [])
         loc = tuple(step.get("location", (-1, -1)))
         direction = step.get("direction", "UP")
         hp = step.get("hp", 0)
@@ -388,114 +355,7 @@ class AgentVisualizer:
         best = step.get("best", [-1, -1])
         path = step.get("path", [])
 
-        # Log the current step
-        print(f"Drawing step {self.current_step + 1} with location {loc} and direction {direction}")
-        print(f"Visited cells: {visited}")
-        print(f"Best cell: {best}")
-        print(f"Agent info: HP={hp}, Potions={potions}, Score={score}, Arrows={arrows}")
-
-        # Draw visited cells 
-        for (x, y) in visited:
-            x0, y0 = y * CELL_SIZE, x * CELL_SIZE
-            self.canvas.create_rectangle(
-                x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE, 
-                fill=COLORS["visited"], tags="cell"
-            )
-
-        # Highlight best cell
-        if best:
-            x0, y0 = best[1] * CELL_SIZE, best[0] * CELL_SIZE
-            self.canvas.create_rectangle(
-                x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE, 
-                fill=COLORS["best"], tags="cell"
-            )
-
-        # Draw path
-        if path:
-            for (x, y) in path:
-                x0, y0 = y * CELL_SIZE, x * CELL_SIZE 
-                self.canvas.create_rectangle(
-                    x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE,
-                    fill=COLORS["inpath"], outline="black", tags="cell"
-                )
-        
-        # Draw entities
-        possible_entities = {
-            "wumpus": (COLORS["wumpus"], SYMBOLS["WUMPUS"]),
-            "pit": (COLORS["pit"], SYMBOLS["PIT"]),
-            "gas": (COLORS["gas"], SYMBOLS["GAS"]),
-            "potion": (COLORS["potion"], SYMBOLS["POTION"]),
-        }
-
-        possible_wumpus = []
-        possible_pit = []
-        possible_gas = []
-        possible_potion = []
-
-        for cell, rank in step.get("ranked", []):
-            if rank < -900:
-                possible_pit.append(cell)
-            elif rank < -400:
-                possible_wumpus.append(cell)
-            elif rank < 200:
-                possible_gas.append(cell)
-            elif rank > 1000:
-                possible_potion.append(cell)
-
-        for (x, y) in possible_wumpus:
-            x0, y0 = y * CELL_SIZE, x * CELL_SIZE
-            self.canvas.create_rectangle(
-                x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE,
-                fill=COLORS["wumpus"], outline="black", tags="entity"
-            )
-            self.canvas.create_text(
-                x0 + CELL_SIZE//2, y0 + CELL_SIZE//2,
-                text=SYMBOLS["WUMPUS"], font=("Arial", 16, "bold"), tags="entity", fill="white"
-            )
-
-        for (x, y) in possible_pit:
-            x0, y0 = y * CELL_SIZE, x * CELL_SIZE
-            self.canvas.create_rectangle(
-                x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE,
-                fill=COLORS["pit"], outline="black", tags="entity"
-            )
-            self.canvas.create_text(
-                x0 + CELL_SIZE//2, y0 + CELL_SIZE//2,
-                text=SYMBOLS["PIT"], font=("Arial", 16, "bold"), tags="entity", fill="white"
-            )
-        for (x, y) in possible_gas:
-            x0, y0 = y * CELL_SIZE, x * CELL_SIZE
-            self.canvas.create_rectangle(
-                x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE,
-                fill=COLORS["gas"], outline="black", tags="entity"
-            )
-            self.canvas.create_text(
-                x0 + CELL_SIZE//2, y0 + CELL_SIZE//2,
-                text=SYMBOLS["GAS"], font=("Arial", 16, "bold"), tags="entity", fill="white"
-            )
-        for (x, y) in possible_potion:
-            x0, y0 = y * CELL_SIZE, x * CELL_SIZE
-            self.canvas.create_rectangle(
-                x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE,
-                fill=COLORS["potion"], outline="black", tags="entity"
-            )
-            self.canvas.create_text(
-                x0 + CELL_SIZE//2, y0 + CELL_SIZE//2,
-                text=SYMBOLS["POTION"], font=("Arial", 16, "bold"), tags="entity", fill="white"
-            )
-
-        # Draw agent
-        if loc != (-1, -1):
-            x0, y0 = loc[1] * CELL_SIZE, loc[0] * CELL_SIZE
-            self.canvas.create_rectangle(
-                x0, y0, x0 + CELL_SIZE, y0 + CELL_SIZE, 
-                fill=COLORS["current"], tags="agent"
-            )
-            self.canvas.create_text(
-                x0 + CELL_SIZE//2, y0 + CELL_SIZE//2,
-                text=SYMBOLS.get(direction, "?"), 
-                font=("Arial", 24, "bold"), tags="agent", fill="blue"
-            )
+        self.apply_looks(cell_looks(step))
 
         # Display agent status
         info = f"Step {self.current_step + 1}/{len(self.steps)}\n"
@@ -514,9 +374,9 @@ class AgentVisualizer:
 
         self.info_label.config(text=info)
         self.step_slider.set(self.current_step + 1)
-        
-        # Update scroll region after zoom
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+
+        # The scroll region is fixed to the board (set in create_widgets);
+        # recomputing bbox("all") every step costs O(board) once zoom is back
         if hasattr(self, 'alert_frame'):
             self.alert_frame.destroy()
 
@@ -678,17 +538,16 @@ class AgentVisualizer:
             self.canvas.yview_scroll(-dy, "units")
             self.pan_start = (event.x, event.y)
 
+    # Both exports render headlessly from the log (render.py), not from the canvas
     def export_image(self):
         from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"wumpus_visualization_{timestamp}.png"
-        
-        # Create a PostScript file and convert to PNG
+
         try:
-            self.canvas.postscript(file="temp.ps", colormode='color')
-            img = Image.open("temp.ps")
-            img.save(filename, "PNG")
-            os.remove("temp.ps")
+            index = min(self.current_step, len(self.steps) - 1)
+            renderer = FrameRenderer(self.board_size)
+            renderer.render(self.steps[index], index, len(self.steps)).save(filename, "PNG")
             messagebox.showinfo("Success", f"Image saved as {filename}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save image: {str(e)}")
@@ -697,34 +556,9 @@ class AgentVisualizer:
         from datetime import datetime
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"wumpus_animation_{timestamp}.gif"
-        
+
         try:
-            images = []
-            current_step = self.current_step
-            
-            # Save each step as an image
-            for i in range(len(self.steps)):
-                self.current_step = i
-                self.draw_step()
-                self.canvas.update()
-                
-                # Capture canvas as image
-                ps = self.canvas.postscript(colormode='color')
-                img = Image.open(io.BytesIO(ps.encode('utf-8')))
-                images.append(img)
-            
-            # Save as animated GIF
-            images[0].save(
-                filename,
-                save_all=True,
-                append_images=images[1:],
-                optimize=False,
-                duration=self.auto_step_delay,
-                loop=0
-            )
-            
-            self.current_step = current_step
-            self.draw_step()
+            export_animation(self.log_file, filename, map_path=self.txt_file, delay=self.auto_step_delay)
             messagebox.showinfo("Success", f"Animation saved as {filename}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to create animation: {str(e)}")
@@ -737,7 +571,7 @@ if __name__ == "__main__":
     from tkinter import filedialog
     log_file = filedialog.askopenfilename(
         title="Select Agent Log File",
-        filetypes=[("JSONL files", "*.jsonl"), ("All files", "*.*")]
+        filetypes=[("Step logs", "*.jsonl *.wtrace"), ("JSONL files", "*.jsonl"), ("Binary traces", "*.wtrace"), ("All files", "*.*")]
     )
 
     file_name = os.path.basename(log_file)
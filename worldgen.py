@@ -0,0 +1,247 @@
+import argparse
+import os
+import random
+import struct
+from collections import deque
+
+from const import board_from_planes
+from mapio import BUNDLE_EXTENSION, TOKENS, write_bundle
+
+# Objects in the order they appear in the binary format
+OBJECTS = ("pit", "wumpus", "gold", "gas", "potion")
+
+# Binary map: magic, version, size, agent row, agent col, then one packed
+# bit-plane per object (bit x*size+y set when the object is at (x, y))
+MAGIC = b"WMAP"
+VERSION = 1
+HEADER = struct.Struct("<4sBHHH")
+
+
+# Split a hazard density into object counts for a size x size board
+def hazard_counts(size: int, density: float):
+    hazards = round(density * (size * size - 1))
+    wumpus = hazards // 4
+    gas = hazards // 4
+    return {"pits": hazards - wumpus - gas, "wumpus": wumpus, "gas": gas}
+
+
+# Draw object positions as {object: [cell index x*size+y]}. Every object
+# sits on its own cell and the start cell stays empty. With
+# clear_start=True hazards and potions also keep off the start's
+# neighbours, so the agent perceives nothing on its first cell (gold may
+# still lie next to it). With solvable=True positions are redrawn until the
+# gold can be reached without crossing a pit or wumpus.
+def draw_objects(size: int, rng: random.Random, pits: int = 0, wumpus: int = 0, gas: int = 0,
+                 potions: int = 0, golds: int = 1, solvable: bool = False, clear_start: bool = False,
+                 max_tries: int = 1000):
+    if golds < 1:
+        raise ValueError("A world needs at least one gold")
+    start_index = (size - 1) * size
+    x, y = divmod(start_index, size)
+    near_start = {start_index}
+    if clear_start:
+        near_start |= {nx * size + ny for nx, ny in [(x+1, y), (x-1, y), (x, y+1), (x, y-1)]
+                       if 0 <= nx < size and 0 <= ny < size}
+
+    felt = pits + wumpus + gas + potions
+    total = felt + golds
+    if total > size * size - 1:
+        raise ValueError(f"{total} objects do not fit on a {size}x{size} board")
+    if felt > size * size - len(near_start):
+        raise ValueError(f"{felt} hazards and potions do not fit on a {size}x{size} board "
+                         f"away from the start")
+
+    cells = [i for i in range(size * size) if i not in near_start]
+
+    for _ in range(max_tries):
+        if clear_start:
+            picked = rng.sample(cells, felt)
+            taken = set(picked)
+            picked += rng.sample([i for i in range(size * size) if i != start_index and i not in taken], golds)
+        else:
+            picked = rng.sample(cells, total)
+        placed = {}
+        offset = 0
+        for obj, count in [("pit", pits), ("wumpus", wumpus), ("gas", gas), ("potion", potions), ("gold", golds)]:
+            placed[obj] = picked[offset:offset + count]
+            offset += count
+
+        blocked = set(placed["pit"]) | set(placed["wumpus"])
+        if not solvable or _reachable(size, start_index, blocked, set(placed["gold"])):
+            return placed
+
+    raise ValueError(f"No solvable world found in {max_tries} tries")
+
+
+# Generate a board (list of per-cell dicts, percepts included) and the agent start
+def generate_world(size: int, seed: int, **counts):
+    placed = draw_objects(size, random.Random(seed), **counts)
+    return _board_from_objects(size, placed), (size - 1, 0)
+
+
+# Gold reachable from `start` without entering a pit or wumpus cell
+def is_solvable(board, start):
+    size = len(board)
+    placed = _objects_from_board(board)
+    blocked = set(placed["pit"]) | set(placed["wumpus"])
+    return _reachable(size, start[0] * size + start[1], blocked, set(placed["gold"]))
+
+
+def _reachable(size: int, start: int, blocked: set, goals: set):
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        index = queue.popleft()
+        if index in goals:
+            return True
+        x, y = divmod(index, size)
+        for nx, ny in [(x+1, y), (x-1, y), (x, y+1), (x, y-1)]:
+            if 0 <= nx < size and 0 <= ny < size:
+                n = nx * size + ny
+                if n not in seen and n not in blocked:
+                    seen.add(n)
+                    queue.append(n)
+    return False
+
+
+def _board_from_objects(size: int, placed):
+    planes = {}
+    for obj, indices in placed.items():
+        plane = planes[obj] = bytearray(size * size)
+        for index in indices:
+            plane[index] = 1
+    return board_from_planes(size, planes)
+
+
+def _objects_from_board(board):
+    size = len(board)
+    placed = {obj: [] for obj in OBJECTS}
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            for obj in OBJECTS:
+                if cell.get(obj, False):
+                    placed[obj].append(i * size + j)
+    return placed
+
+
+# Board in the `.`-separated text format read by mapio
+def to_text(board, agent_pos):
+    return _text_from_objects(len(board), _objects_from_board(board), agent_pos)
+
+
+def _text_from_objects(size: int, placed, agent_pos):
+    tokens = [""] * (size * size)
+    for obj in OBJECTS:
+        for index in placed.get(obj, ()):
+            tokens[index] += TOKENS[obj]
+    tokens[agent_pos[0] * size + agent_pos[1]] = "A" + tokens[agent_pos[0] * size + agent_pos[1]]
+
+    lines = [str(size)]
+    for i in range(size):
+        lines.append(".".join(token or "-" for token in tokens[i * size:(i + 1) * size]))
+    return "\n".join(lines) + "\n"
+
+
+def to_bytes(board, agent_pos):
+    return _bytes_from_objects(len(board), _objects_from_board(board), agent_pos)
+
+
+def _bytes_from_objects(size: int, placed, agent_pos):
+    plane_bytes = (size * size + 7) // 8
+    data = [HEADER.pack(MAGIC, VERSION, size, agent_pos[0], agent_pos[1])]
+    for obj in OBJECTS:
+        plane = 0
+        for index in placed.get(obj, ()):
+            plane |= 1 << index
+        data.append(plane.to_bytes(plane_bytes, "little"))
+    return b"".join(data)
+
+
+def from_bytes(data):
+    magic, version, size, ax, ay = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a binary Wumpus map")
+
+    plane_bytes = (size * size + 7) // 8
+    placed = {}
+    offset = HEADER.size
+    for obj in OBJECTS:
+        plane = int.from_bytes(data[offset:offset + plane_bytes], "little")
+        offset += plane_bytes
+        placed[obj] = []
+        while plane:
+            low = plane & -plane
+            placed[obj].append(low.bit_length() - 1)
+            plane ^= low
+
+    return _board_from_objects(size, placed), (ax, ay)
+
+
+# Write `count` maps seeded seed, seed+1, ... into out_dir; returns the paths.
+# Maps are encoded straight from the drawn positions, without building boards.
+# The "bundle" format writes them all into one map bundle instead.
+def write_maps(out_dir: str, count: int, seed: int = 0, fmt: str = "txt", size: int = 10, **counts):
+    if fmt not in ("txt", "bin", "bundle"):
+        raise ValueError(f"Unknown map format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    agent_pos = (size - 1, 0)
+    if fmt == "bundle":
+        path = os.path.join(out_dir, f"maps_{seed:06d}_{count}{BUNDLE_EXTENSION}")
+
+        def texts():
+            for n in range(count):
+                placed = draw_objects(size, random.Random(seed + n), **counts)
+                yield f"map_{seed + n:06d}", _text_from_objects(size, placed, agent_pos)
+
+        write_bundle(path, texts())
+        return [path]
+
+    paths = []
+    for n in range(count):
+        placed = draw_objects(size, random.Random(seed + n), **counts)
+        path = os.path.join(out_dir, f"map_{seed + n:06d}.{fmt}")
+        if fmt == "txt":
+            with open(path, "w") as f:
+                f.write(_text_from_objects(size, placed, agent_pos))
+        else:
+            with open(path, "wb") as f:
+                f.write(_bytes_from_objects(size, placed, agent_pos))
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate seeded Wumpus World maps")
+    parser.add_argument("--out", default="input/generated")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=10)
+    parser.add_argument("--pits", type=int, default=None)
+    parser.add_argument("--wumpus", type=int, default=None)
+    parser.add_argument("--gas", type=int, default=None)
+    parser.add_argument("--potions", type=int, default=1)
+    parser.add_argument("--golds", type=int, default=1)
+    parser.add_argument("--density", type=float, default=0.1,
+                        help="hazard density used for counts that are not given")
+    parser.add_argument("--solvable", action="store_true")
+    parser.add_argument("--clear-start", action="store_true",
+                        help="keep hazards and potions off the start's neighbours")
+    parser.add_argument("--format", choices=["txt", "bin", "bundle"], default="txt")
+    args = parser.parse_args(argv)
+
+    counts = hazard_counts(args.size, args.density)
+    for key in counts:
+        if getattr(args, key) is not None:
+            counts[key] = getattr(args, key)
+
+    paths = write_maps(args.out, args.count, seed=args.seed, fmt=args.format, size=args.size,
+                       potions=args.potions, golds=args.golds, solvable=args.solvable,
+                       clear_start=args.clear_start, **counts)
+    if args.format == "bundle":
+        print(f"Wrote {args.count} maps to {paths[0]}")
+    else:
+        print(f"Wrote {len(paths)} maps to {args.out}")
+
+
+if __name__ == "__main__":
+    main()